@@ -1,56 +1,24 @@
-import yfinance as yf
-import pandas as pd
-import numpy as np
-import pandas_datareader.data as web
-
-def get_kdj(data, n=9, m1=3, m2=3):
-    """
-    計算給定股票數據的KDJ指標
-    :param data: 包含'High', 'Low', 'Close'列的股票數據DataFrame
-    :param n: KDJ指標的計算周期,默認為9
-    :param m1: K值的平滑周期,默認為3
-    :param m2: D值的平滑周期,默認為3
-    :return: 包含K值、D值和J值的DataFrame
-    """
-    low_min = data['Low'].rolling(window=n).min()
-    high_max = data['High'].rolling(window=n).max()
-    rsv = (data['Close'] - low_min) / (high_max - low_min) * 100
-    k = rsv.ewm(span=m1, adjust=False).mean()
-    d = k.ewm(span=m2, adjust=False).mean()
-    j = 3 * k - 2 * d
-    return pd.DataFrame({'K': k, 'D': d, 'J': j}, index=data.index)
+import price_store
+from universe import get_sp500_symbols
+from indicators import get_kdj_signal
 
 def get_signal(data, buy_threshold=20, sell_threshold=80):
     """
-    根據KDJ指標生成交易信號
+    根據KDJ指標生成交易信號,K值與D值的交叉配合J值的位置,計算見indicators.get_kdj_signal
     :param data: 包含'High', 'Low', 'Close'列的股票數據DataFrame
     :param buy_threshold: 買入閾值,默認為20
     :param sell_threshold: 賣出閾值,默認為80
     :return: 包含交易信號的DataFrame
     """
-    kdj_data = get_kdj(data)
-    signal = pd.DataFrame(index=kdj_data.index, columns=['Signal'])
-    
-    # 判斷K值和D值的交叉情況以及J值的位置
-    k_cross_above_d = (kdj_data['K'].shift(1) <= kdj_data['D'].shift(1)) & (kdj_data['K'] > kdj_data['D'])
-    k_cross_below_d = (kdj_data['K'].shift(1) >= kdj_data['D'].shift(1)) & (kdj_data['K'] < kdj_data['D'])
-    j_above_buy_threshold = kdj_data['J'] > buy_threshold
-    j_below_sell_threshold = kdj_data['J'] < sell_threshold
-    
-    buy_signal = k_cross_above_d & j_above_buy_threshold
-    sell_signal = k_cross_below_d & j_below_sell_threshold
-    
-    signal['Signal'] = np.where(buy_signal, 'Buy', np.where(sell_signal, 'Sell', ''))
-    return signal
+    return get_kdj_signal(data, buy_threshold=buy_threshold, sell_threshold=sell_threshold).to_frame('Signal')
 
-def get_stock_data(symbol, period="max"):
+def get_stock_data(symbol):
     """
-    從Yahoo Finance下載股票數據
+    從本地價格庫讀取股票數據,由get_tradable_stocks批次更新
     :param symbol: 股票代碼
-    :param period: 數據期間,默認為"max"
     :return: 包含股票數據的DataFrame
     """
-    return yf.download(symbol, period=period)
+    return price_store.load_prices(symbol)
 
 def get_tradable_stocks(symbols, buy_threshold=20, sell_threshold=80):
     """
@@ -60,6 +28,7 @@ def get_tradable_stocks(symbols, buy_threshold=20, sell_threshold=80):
     :param sell_threshold: 賣出閾值,默認為80
     :return: 可買入和可賣出的股票列表
     """
+    price_store.refresh_store(symbols)  # 批次下載最後一筆之後的新數據
     buyable_stocks = []
     sellable_stocks = []
     for symbol in symbols:
@@ -75,14 +44,13 @@ def get_tradable_stocks(symbols, buy_threshold=20, sell_threshold=80):
             print(f"Error processing {symbol}: {str(e)}")
     return buyable_stocks, sellable_stocks
 
-# 從Wikipedia獲取標普500的成分股列表
-table = pd.read_html('http://en.wikipedia.org/wiki/List_of_S%26P_500_companies')
-df = table[0]
-all_symbols = df['Symbol'].tolist()
+if __name__ == "__main__":
+    # 從本地快照獲取標普500的成分股列表,過期時在背景更新
+    all_symbols = list(get_sp500_symbols())
 
-# 應用範例
-buyable, sellable = get_tradable_stocks(all_symbols)
-print(f"可買入的股票: {buyable}")
-print(f"可賣出的股票: {sellable}")
+    # 應用範例
+    buyable, sellable = get_tradable_stocks(all_symbols)
+    print(f"可買入的股票: {buyable}")
+    print(f"可賣出的股票: {sellable}")
 
 # reference: https://tw.stock.yahoo.com/news/%E6%8A%80%E8%A1%93%E5%88%86%E6%9E%90-kdj%E6%8C%87%E6%A8%99-%E8%82%A1%E7%A5%A8%E8%B6%85%E8%B2%B7%E8%B6%85%E8%B3%A3-%E8%82%A1%E5%83%B9%E8%BD%89%E6%8A%98%E9%BB%9E-%E8%B2%B7%E8%B3%A3%E8%A8%8A%E8%99%9F-133421567.html
\ No newline at end of file
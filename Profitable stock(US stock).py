@@ -1,45 +1,24 @@
-import yfinance as yf
-import pandas as pd
-import numpy as np
-import pandas_datareader.data as web
-
-def get_rsi(data, period=14):
-    """
-    計算給定股票數據的RSI指標
-    :param data: 包含'Adj Close'列的股票數據DataFrame
-    :param period: RSI計算周期,默認為14
-    :return: 包含RSI值的DataFrame
-    """
-    delta = data['Adj Close'].diff()
-    up = delta.where(delta > 0, 0)
-    down = -delta.where(delta < 0, 0)
-    avg_gain = up.rolling(window=period).mean()
-    avg_loss = down.rolling(window=period).mean()
-    rs = avg_gain / avg_loss
-    rsi = 100 - (100 / (1 + rs))
-    return pd.DataFrame({'RSI': rsi}, index=data.index)
+import price_store
+from universe import get_sp500_symbols
+from indicators import get_rsi_signal
 
 def get_signal(data, buy_threshold=20, sell_threshold=80):
     """
-    根據RSI指標生成交易信號
+    根據RSI指標生成交易信號,計算見indicators.get_rsi_signal
     :param data: 包含'Adj Close'列的股票數據DataFrame
-    :param buy_threshold: 買入閾值,默認為30
-    :param sell_threshold: 賣出閾值,默認為70
+    :param buy_threshold: 買入閾值,默認為20
+    :param sell_threshold: 賣出閾值,默認為80
     :return: 包含交易信號的DataFrame
     """
-    rsi = get_rsi(data)
-    signal = pd.DataFrame(index=rsi.index, columns=['Signal'])
-    signal['Signal'] = np.where(rsi['RSI'] < buy_threshold, 'Buy', np.where(rsi['RSI'] > sell_threshold, 'Sell', ''))
-    return signal
+    return get_rsi_signal(data, buy_threshold=buy_threshold, sell_threshold=sell_threshold).to_frame('Signal')
 
-def get_stock_data(symbol, period="max"):
+def get_stock_data(symbol):
     """
-    從Yahoo Finance下載股票數據
+    從本地價格庫讀取股票數據,由get_tradable_stocks批次更新
     :param symbol: 股票代碼
-    :param period: 數據期間,默認為"max"
     :return: 包含股票數據的DataFrame
     """
-    return yf.download(symbol, period=period)
+    return price_store.load_prices(symbol)
 
 def get_tradable_stocks(symbols, buy_threshold=20, sell_threshold=80):
     """
@@ -49,6 +28,7 @@ def get_tradable_stocks(symbols, buy_threshold=20, sell_threshold=80):
     :param sell_threshold: 賣出閾值,默認為80
     :return: 可買入和可賣出的股票列表
     """
+    price_store.refresh_store(symbols)  # 批次下載最後一筆之後的新數據
     buyable_stocks = []
     sellable_stocks = []
     for symbol in symbols:
@@ -64,12 +44,12 @@ def get_tradable_stocks(symbols, buy_threshold=20, sell_threshold=80):
             print(f"Error processing {symbol}: {str(e)}")
     return buyable_stocks, sellable_stocks
 
-# 從Wikipedia獲取標普500的成分股列表
-table=pd.read_html('http://en.wikipedia.org/wiki/List_of_S%26P_500_companies')
-df = table[0]
-all_symbols = df['Symbol'].tolist()
+if __name__ == "__main__":
+    # 從本地快照獲取標普500的成分股列表,過期時在背景更新
+    all_symbols = list(get_sp500_symbols())
+
+    # 應用範例
+    buyable, sellable = get_tradable_stocks(all_symbols)
+    print(f"可買入的股票: {buyable}")
+    print(f"可賣出的股票: {sellable}")
 
-# 應用範例
-buyable, sellable = get_tradable_stocks(all_symbols)
-print(f"可買入的股票: {buyable}")
-print(f"可賣出的股票: {sellable}")
\ No newline at end of file
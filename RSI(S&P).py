@@ -1,62 +1,17 @@
-import yfinance as yf
-import pandas as pd
-import numpy as np
-from concurrent.futures import ProcessPoolExecutor, as_completed
-from tqdm import tqdm
 import time
 import logging
-import requests
-from io import StringIO
 import functools
-from multiprocessing import cpu_count
+import price_store
+import pipeline
+import instrument
+from checkpoint import open_checkpoint
+from universe import get_sp500_symbols
+from indicators import get_rsi, tail_window
 
-# Set up logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
-
-@functools.lru_cache(maxsize=None)
-def get_sp500_symbols():
-    """
-    Get the list of S&P 500 stock symbols
-    """
-    url = "https://en.wikipedia.org/wiki/List_of_S%26P_500_companies"
-    for _ in range(3):  # Retry 3 times
-        try:
-            tables = pd.read_html(url)
-            df = tables[0]
-            return tuple(df['Symbol'].tolist())
-        except Exception as e:
-            logging.error(f"Error fetching S&P 500 list: {e}")
-            time.sleep(5)  # Wait 5 seconds before retrying
-    return tuple()
-
-def get_stock_data(symbol, period="max"):
-    """
-    Download stock data from Yahoo Finance
-    """
+def process_stock(symbol, data, buy_threshold=20, sell_threshold=80):
     try:
-        data = yf.download(symbol, period=period)
-        return data
-    except Exception as e:
-        logging.error(f"Error fetching data for {symbol}: {str(e)}")
-        return pd.DataFrame()
-
-def get_rsi(data, period=14):
-    """
-    Calculate RSI indicator
-    """
-    delta = data['Adj Close'].diff()
-    up = delta.where(delta > 0, 0)
-    down = -delta.where(delta < 0, 0)
-    avg_gain = up.rolling(window=period).mean()
-    avg_loss = down.rolling(window=period).mean()
-    rs = avg_gain / avg_loss
-    rsi = 100 - (100 / (1 + rs))
-    return rsi
-
-def process_stock(symbol, buy_threshold=20, sell_threshold=80):
-    try:
-        data = get_stock_data(symbol)
         if not data.empty and len(data) > 30:
+            data = tail_window(data, 'rsi')  # Only the bars needed for converged last values
             rsi = get_rsi(data)
             last_rsi = rsi.iloc[-1]
             
@@ -68,32 +23,29 @@ def process_stock(symbol, buy_threshold=20, sell_threshold=80):
         logging.error(f"Error processing {symbol}: {str(e)}")
     return symbol, None
 
-def get_tradable_stocks(buy_threshold=20, sell_threshold=80):
-    all_stocks = get_sp500_symbols()
-    results = []
-    
-    with ProcessPoolExecutor(max_workers=cpu_count()) as executor:
-        futures = [executor.submit(process_stock, symbol, buy_threshold, sell_threshold) for symbol in all_stocks]
-        
-        for future in tqdm(as_completed(futures), total=len(futures), desc="Processing stocks"):
-            result = future.result()
-            if result[1] is not None:
-                results.append(result)
-    
-    buyable_stocks = [symbol for symbol, signal in results if signal == 'Buy']
-    sellable_stocks = [symbol for symbol, signal in results if signal == 'Sell']
-    
-    return buyable_stocks, sellable_stocks
+def get_tradable_stocks(buy_threshold=20, sell_threshold=80, fetch=price_store.refresh_chunk, symbols=None, compute_workers=None, checkpoint_name=None):
+    """
+    Scan the symbols (the S&P 500 constituents by default) with data from fetch, e.g. a data provider's fetch
+    With checkpoint_name finished symbols are stored as the scan goes and an interrupted scan resumes where it stopped
+    """
+    all_stocks = get_sp500_symbols() if symbols is None else symbols
+    compute = functools.partial(process_stock, buy_threshold=buy_threshold, sell_threshold=sell_threshold)
+    checkpoint = open_checkpoint(checkpoint_name, all_stocks, {'buy_threshold': buy_threshold, 'sell_threshold': sell_threshold}) if checkpoint_name else None
+    return pipeline.scan_signals(all_stocks, fetch, compute, compute_workers=compute_workers, checkpoint=checkpoint)
 
 # Main program
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
     logging.info("Starting analysis")
     start_time = time.time()
     
-    buyable, sellable = get_tradable_stocks()
+    with instrument.record_run("RSI-SP500") as stats:
+        buyable, sellable = get_tradable_stocks(checkpoint_name="RSI(S&P)")
     
     logging.info(f"RSI Buyable Stocks: {buyable}")
     logging.info(f"RSI Sellable Stocks: {sellable}")
     
     end_time = time.time()
-    logging.info(f"Analysis completed. Execution time: {end_time - start_time:.2f} seconds")
\ No newline at end of file
+    logging.info(f"Analysis completed. Execution time: {end_time - start_time:.2f} seconds")
+    logging.info(stats.summary())
+    logging.info(f"Run report saved to {stats.save()}")
\ No newline at end of file
@@ -1,35 +1,25 @@
-import yfinance as yf
-import pandas as pd
-import numpy as np
-import pandas_datareader.data as web
+import price_store
+from universe import get_sp500_symbols
+from indicators import get_vol_signal as _get_vol_signal
 
 def get_vol_signal(data, n=20, buy_threshold=1.5, sell_threshold=0.5):
     """
-    根據成交量指標生成交易信號
+    根據成交量指標生成交易信號,計算見indicators.get_vol_signal
     :param data: 包含'Volume'列的股票數據DataFrame
     :param n: 成交量平均值的計算周期,默認為20
     :param buy_threshold: 買入閾值,默認為1.5
     :param sell_threshold: 賣出閾值,默認為0.5
     :return: 包含交易信號的DataFrame
     """
-    vol_avg = data['Volume'].rolling(window=n).mean()
-    vol_ratio = data['Volume'] / vol_avg
-    
-    signal = pd.DataFrame(index=data.index, columns=['Signal'])
-    buy_signal = vol_ratio > buy_threshold
-    sell_signal = vol_ratio < sell_threshold
-    
-    signal['Signal'] = np.where(buy_signal, 'Buy', np.where(sell_signal, 'Sell', ''))
-    return signal
+    return _get_vol_signal(data, n, buy_threshold, sell_threshold).to_frame('Signal')
 
-def get_stock_data(symbol, period="max"):
+def get_stock_data(symbol):
     """
-    從Yahoo Finance下載股票數據
+    從本地價格庫讀取股票數據,由get_tradable_stocks批次更新
     :param symbol: 股票代碼
-    :param period: 數據期間,默認為"max"
     :return: 包含股票數據的DataFrame
     """
-    return yf.download(symbol, period=period)
+    return price_store.load_prices(symbol)
 
 def get_tradable_stocks(symbols, n=20, buy_threshold=1.5, sell_threshold=0.5):
     """
@@ -40,6 +30,7 @@ def get_tradable_stocks(symbols, n=20, buy_threshold=1.5, sell_threshold=0.5):
     :param sell_threshold: 賣出閾值,默認為0.5
     :return: 可買入和可賣出的股票列表
     """
+    price_store.refresh_store(symbols)  # 批次下載最後一筆之後的新數據
     buyable_stocks = []
     sellable_stocks = []
     for symbol in symbols:
@@ -55,12 +46,12 @@ def get_tradable_stocks(symbols, n=20, buy_threshold=1.5, sell_threshold=0.5):
             print(f"Error processing {symbol}: {str(e)}")
     return buyable_stocks, sellable_stocks
 
-# 從Wikipedia獲取標普500的成分股列表
-table = pd.read_html('http://en.wikipedia.org/wiki/List_of_S%26P_500_companies')
-df = table[0]
-all_symbols = df['Symbol'].tolist()
+if __name__ == "__main__":
+    # 從本地快照獲取標普500的成分股列表,過期時在背景更新
+    all_symbols = list(get_sp500_symbols())
+
+    # 應用範例
+    buyable, sellable = get_tradable_stocks(all_symbols)
+    print(f"可買入的股票: {buyable}")
+    print(f"可賣出的股票: {sellable}")
 
-# 應用範例
-buyable, sellable = get_tradable_stocks(all_symbols)
-print(f"可買入的股票: {buyable}")
-print(f"可賣出的股票: {sellable}")
\ No newline at end of file
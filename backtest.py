@@ -0,0 +1,119 @@
+import pandas as pd
+import numpy as np
+import time
+import logging
+import argparse
+import price_store
+from batch_fetch import chunked
+from panel import build_panel, align_bars, panel_signals, BUY, SELL
+
+# Number of symbols backtested together on one price panel
+CHUNK_SIZE = 500
+
+def signals_to_positions(signals):
+    """
+    Long position from the bar after a Buy until the bar after the next Sell, flat otherwise
+    """
+    state = signals.where(signals != 0).replace({BUY: 1.0, SELL: 0.0})
+    return state.ffill().fillna(0.0).shift(1).fillna(0.0)
+
+def backtest(close, signals, fee=0.0):
+    """
+    Backtest the Buy/Sell signal codes of every symbol of a dates x symbols close panel
+    fee is charged as a fraction of the position on every entry and exit
+    Returns one row per symbol with total return, buy and hold return, max drawdown, trades, hit rate and holding period
+    """
+    positions = signals_to_positions(signals)
+    returns = close.pct_change(fill_method=None).fillna(0.0)
+    turnover = positions.diff().abs().fillna(positions.abs())
+    strategy_returns = positions * returns - turnover * fee
+
+    equity = (1 + strategy_returns).cumprod()
+    drawdown = equity / equity.cummax() - 1
+
+    # Number every trade of a symbol, bars outside a position belong to trade 0
+    entries = (positions.diff().fillna(positions) > 0).astype(int)
+    trade_ids = entries.cumsum() * (positions > 0)
+    log_returns = np.log1p(strategy_returns)
+    long_form = pd.DataFrame({
+        'trade': trade_ids.stack(),
+        'log_return': log_returns.stack(),
+    })
+    long_form = long_form[long_form['trade'] > 0]
+    long_form.index.names = ['Date', 'Symbol']
+    grouped = long_form.groupby([long_form.index.get_level_values('Symbol'), long_form['trade']])
+    trades = pd.DataFrame({
+        'return': np.expm1(grouped['log_return'].sum()),
+        'bars': grouped.size(),
+    })
+    by_symbol = trades.groupby(level=0)
+
+    table = pd.DataFrame(index=close.columns)
+    table.index.name = 'Symbol'
+    table['Total Return'] = equity.iloc[-1] - 1
+    table['Buy and Hold Return'] = close.ffill().iloc[-1] / close.bfill().iloc[0] - 1
+    table['Max Drawdown'] = drawdown.min()
+    table['Trades'] = by_symbol.size().reindex(table.index).fillna(0).astype(int)
+    table['Hit Rate'] = (trades['return'] > 0).groupby(level=0).mean().reindex(table.index)
+    table['Average Trade Return'] = by_symbol['return'].mean().reindex(table.index)
+    table['Average Holding Period'] = by_symbol['bars'].mean().reindex(table.index)
+    table['Time in Market'] = (positions > 0).sum() / close.notna().sum()
+    return table
+
+def backtest_panel(panel, indicator, fee=0.0, **params):
+    """
+    Backtest the signals of one indicator on a price panel, prices are taken from Adj Close
+    The panel is aligned by bar position first, so every symbol is traded on its own bars like a single-symbol backtest
+    """
+    panel, _ = align_bars(panel)
+    _, signals = panel_signals(panel, indicator, **params)
+    return backtest(panel['Adj Close'], signals, fee)
+
+def backtest_symbols(symbols, indicator, fetch=price_store.load_chunk, chunk_size=CHUNK_SIZE, fee=0.0, **params):
+    """
+    Backtest an indicator over many symbols chunk by chunk, reading local price data by default
+    """
+    tables = []
+    for chunk in chunked(symbols, chunk_size):
+        frames = fetch(chunk)
+        if frames:
+            tables.append(backtest_panel(build_panel(frames), indicator, fee, **params))
+    return pd.concat(tables).sort_index() if tables else pd.DataFrame()
+
+def summarize(table):
+    """
+    Aggregate the per-symbol backtest results of one indicator
+    """
+    return pd.Series({
+        'Symbols': len(table),
+        'Median Total Return': table['Total Return'].median(),
+        'Mean Total Return': table['Total Return'].mean(),
+        'Median Buy and Hold Return': table['Buy and Hold Return'].median(),
+        'Median Max Drawdown': table['Max Drawdown'].median(),
+        'Trades': table['Trades'].sum(),
+        'Hit Rate': table['Hit Rate'].mean(),
+        'Average Holding Period': table['Average Holding Period'].mean(),
+    })
+
+# Main program
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Backtest the Buy/Sell signals on the local price store")
+    parser.add_argument('--indicators', nargs='+', default=['rsi', 'macd', 'kdj', 'vol'], choices=['rsi', 'macd', 'kdj', 'vol'])
+    parser.add_argument('--symbols', nargs='+', help="Symbols to backtest, defaults to every symbol in the price store")
+    parser.add_argument('--fee', type=float, default=0.0, help="Fee per entry and exit as a fraction of the position")
+    parser.add_argument('--output', help="Write the per-symbol results to this CSV file")
+    args = parser.parse_args()
+
+    start_time = time.time()
+    symbols = args.symbols or price_store.stored_symbols()
+    results = []
+    for name in args.indicators:
+        table = backtest_symbols(symbols, name, fee=args.fee)
+        logging.info(f"{name.upper()} backtest:\n{summarize(table).to_string()}")
+        results.append(table.assign(Indicator=name.upper()))
+    if args.output and results:
+        pd.concat(results).to_csv(args.output)
+
+    end_time = time.time()
+    logging.info(f"Backtest completed. Execution time: {end_time - start_time:.2f} seconds")
@@ -0,0 +1,81 @@
+import pandas as pd
+import logging
+import threading
+import instrument
+
+# Number of symbols requested from Yahoo Finance in one call
+CHUNK_SIZE = 100
+# yf.download keeps its results in module level state, so concurrent calls from the fetch threads can drop or
+# mix up symbols. One download runs at a time, each one already fetches its symbols with threads of its own
+_download_lock = threading.Lock()
+
+def chunked(symbols, chunk_size=CHUNK_SIZE):
+    """
+    Split a list of symbols into chunks of at most chunk_size symbols
+    """
+    symbols = list(symbols)
+    return [symbols[i:i + chunk_size] for i in range(0, len(symbols), chunk_size)]
+
+def split_frames(data, symbols):
+    """
+    Split the wide (Ticker, Price) result of a multi-ticker download into one DataFrame per symbol
+    """
+    frames = {}
+    if data.empty:
+        return frames
+    if not isinstance(data.columns, pd.MultiIndex):
+        # Older yfinance versions return flat columns when a single symbol is requested
+        if len(symbols) == 1:
+            frames[symbols[0]] = data.dropna(how='all')
+        return frames
+    tickers = set(data.columns.get_level_values(0))
+    for symbol in symbols:
+        if symbol not in tickers:
+            continue
+        frame = data[symbol].dropna(how='all')
+        frame.columns.name = None
+        if not frame.empty:
+            frames[symbol] = frame
+    return frames
+
+def download_chunk(symbols, start=None):
+    """
+    Download one chunk of symbols with a single Yahoo Finance request, one chunk at a time per process
+    """
+    import yfinance as yf  # Imported on first download, it is slow to import and most runs read the local store
+    kwargs = {'start': start} if start is not None else {'period': "max"}
+    with _download_lock:
+        data = yf.download(list(symbols), group_by='ticker', auto_adjust=False, progress=False, threads=True, **kwargs)
+    return split_frames(data, list(symbols))
+
+def fetch_symbols(symbols, start=None, chunk_size=CHUNK_SIZE, retries=2):
+    """
+    Download many symbols in chunks and return a dict of symbol -> DataFrame
+    Symbols missing from a chunk result are retried individually
+    """
+    frames = {}
+    failed = []
+    for chunk in chunked(symbols, chunk_size):
+        try:
+            result = download_chunk(chunk, start)
+        except Exception as e:
+            logging.error(f"Error fetching chunk starting with {chunk[0]}: {str(e)}")
+            result = {}
+        frames.update(result)
+        failed.extend(symbol for symbol in chunk if symbol not in result)
+
+    for symbol in failed:
+        for attempt in range(retries):
+            instrument.count('retries')
+            try:
+                result = download_chunk([symbol], start)
+            except Exception as e:
+                logging.error(f"Error fetching data for {symbol} (attempt {attempt + 1}): {str(e)}")
+                continue
+            if symbol in result:
+                frames[symbol] = result[symbol]
+                break
+        else:
+            logging.warning(f"No data fetched for {symbol}")
+            instrument.count('missing_symbols')
+    return frames
@@ -0,0 +1,63 @@
+import time
+import argparse
+import tracemalloc
+from common import save_results
+from indicators import get_rsi, get_macd, get_kdj, get_vol_signal, set_engine, get_engine, ENGINES
+from providers import SyntheticProvider
+
+# History lengths (bars) every indicator is timed on
+LENGTHS = (250, 1000, 5000, 10000)
+
+KERNELS = {
+    'get_rsi': get_rsi,
+    'get_macd': get_macd,
+    'get_kdj': get_kdj,
+    'get_vol_signal': get_vol_signal,
+}
+
+def time_kernel(func, data, repeat=5, number=10):
+    """
+    Best time per call over repeat runs of number calls, and the peak memory allocated by one call
+    """
+    func(data)  # Warm up
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func(data)
+        best = min(best, (time.perf_counter() - start) / number)
+    tracemalloc.start()
+    func(data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+def run(lengths=LENGTHS, kernels=tuple(KERNELS), repeat=5, number=10):
+    results = []
+    for length in lengths:
+        data = SyntheticProvider(bars=length).fetch(['BENCH'])['BENCH']
+        for name in kernels:
+            seconds, peak = time_kernel(KERNELS[name], data, repeat, number)
+            results.append({
+                'name': name,
+                'params': {'bars': length, 'engine': get_engine()},
+                'seconds': seconds,
+                'throughput': length / seconds,  # Bars per second
+                'peak_memory_mb': peak / 2**20,
+            })
+            print(f"{name:16s} {get_engine():6s} {length:6d} bars  {seconds * 1e3:8.3f} ms  {peak / 2**20:8.2f} MB")
+    return results
+
+# Main program
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the indicator functions across history lengths")
+    parser.add_argument('--lengths', nargs='+', type=int, default=list(LENGTHS))
+    parser.add_argument('--kernels', nargs='+', default=list(KERNELS), choices=list(KERNELS))
+    parser.add_argument('--engine', choices=ENGINES, default=get_engine(), help="Implementation of the indicator functions")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--number', type=int, default=10)
+    parser.add_argument('--output', help="Result file, defaults to results/indicators-<timestamp>.json")
+    args = parser.parse_args()
+    set_engine(args.engine)
+    results = run(args.lengths, args.kernels, args.repeat, args.number)
+    print(f"Saved {save_results('indicators', results, args.output)}")
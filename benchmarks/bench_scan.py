@@ -0,0 +1,77 @@
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import subprocess
+from common import save_results, load_script
+
+# Universe sizes and worker counts of the end-to-end scans
+SIZES = (500, 5000, 10000)
+WORKERS = (1, 2, 4, 8)
+
+SCANNERS = {
+    'rsi': 'RSI(ALL).py',
+    'macd': 'MACD(ALL).py',
+    'kdj': 'KDJ(ALL).py',
+    'vol': 'VOL(ALL).py',
+}
+
+def run_one(scanner, size, workers, bars, seed):
+    """
+    One get_tradable_stocks run on synthetic data, meant to be called in a fresh process
+    """
+    from providers import SyntheticProvider, synthetic_symbols
+    module = load_script(SCANNERS[scanner])
+    provider = SyntheticProvider(seed=seed, bars=bars)
+    start = time.perf_counter()
+    buyable, sellable = module.get_tradable_stocks(fetch=provider.fetch, symbols=synthetic_symbols(size), compute_workers=workers)
+    seconds = time.perf_counter() - start
+    # ru_maxrss is in KB on Linux
+    return {
+        'name': scanner,
+        'params': {'symbols': size, 'workers': workers, 'bars': bars},
+        'seconds': seconds,
+        'throughput': size / seconds,  # Symbols per second
+        'peak_rss_main_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'peak_rss_worker_mb': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+        'buyable': len(buyable),
+        'sellable': len(sellable),
+    }
+
+def run(scanners=tuple(SCANNERS), sizes=SIZES, workers=WORKERS, bars=2500, seed=0):
+    """
+    Every configuration runs in its own process so the peak memory figures do not carry over
+    """
+    results = []
+    env = dict(os.environ, TQDM_DISABLE='1')
+    for scanner in scanners:
+        for size in sizes:
+            for worker_count in workers:
+                config = json.dumps([scanner, size, worker_count, bars, seed])
+                output = subprocess.run([sys.executable, os.path.abspath(__file__), '--run-one', config],
+                                        capture_output=True, text=True, env=env, check=True).stdout
+                result = json.loads(output.strip().splitlines()[-1])
+                results.append(result)
+                print(f"{scanner:5s} {size:6d} symbols {worker_count:3d} workers  {result['seconds']:8.2f} s  "
+                      f"{result['throughput']:8.1f} symbols/s  {result['peak_rss_main_mb']:8.1f} MB main  "
+                      f"{result['peak_rss_worker_mb']:8.1f} MB worker")
+    return results
+
+# Main program
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time get_tradable_stocks end to end on synthetic universes")
+    parser.add_argument('--scanners', nargs='+', default=list(SCANNERS), choices=list(SCANNERS))
+    parser.add_argument('--sizes', nargs='+', type=int, default=list(SIZES))
+    parser.add_argument('--workers', nargs='+', type=int, default=list(WORKERS))
+    parser.add_argument('--bars', type=int, default=2500, help="History length of every synthetic symbol")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Result file, defaults to results/scan-<timestamp>.json")
+    parser.add_argument('--run-one', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.run_one:
+        print(json.dumps(run_one(*json.loads(args.run_one))))
+    else:
+        results = run(args.scanners, args.sizes, args.workers, args.bars, args.seed)
+        print(f"Saved {save_results('scan', results, args.output)}")
@@ -0,0 +1,60 @@
+import os
+import sys
+import json
+import time
+import platform
+import importlib.util
+from multiprocessing import cpu_count
+
+# Benchmarks run from this directory but import the modules at the repository root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+def load_script(filename):
+    """
+    Import one of the scanner scripts whose file names are not valid module names
+    """
+    name = "bench_" + "".join(c if c.isalnum() else "_" for c in filename[:-3])
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, filename))
+    module = importlib.util.module_from_spec(spec)
+    # Registered before executing so worker processes can unpickle its functions
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+def environment():
+    """
+    Versions and machine details stored next to every result
+    """
+    import numpy as np
+    import pandas as pd
+    return {
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'platform': platform.platform(),
+        'cpu_count': cpu_count(),
+    }
+
+def save_results(benchmark, results, output=None):
+    """
+    Write benchmark results as JSON, by default to results/<benchmark>-<timestamp>.json
+    """
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{benchmark}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    payload = {
+        'benchmark': benchmark,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'environment': environment(),
+        'results': results,
+    }
+    with open(output, 'w') as f:
+        json.dump(payload, f, indent=2)
+    return output
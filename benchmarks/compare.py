@@ -0,0 +1,43 @@
+import sys
+import json
+import argparse
+
+def load(path):
+    with open(path) as f:
+        payload = json.load(f)
+    return {(r['name'], json.dumps(r['params'], sort_keys=True)): r for r in payload['results']}
+
+def compare(baseline_path, current_path, threshold=0.2):
+    """
+    Compare two result files of the same benchmark, returns the list of regressions
+    A regression is a throughput drop or a peak memory growth of more than threshold
+    """
+    baseline = load(baseline_path)
+    current = load(current_path)
+    regressions = []
+    for key in sorted(baseline.keys() & current.keys()):
+        old, new = baseline[key], current[key]
+        change = new['throughput'] / old['throughput'] - 1
+        line = f"{key[0]:16s} {key[1]:50s} throughput {change:+7.1%}"
+        if change < -threshold:
+            regressions.append(f"{key[0]} {key[1]}: throughput {change:+.1%}")
+        for field in ('peak_memory_mb', 'peak_rss_main_mb', 'peak_rss_worker_mb'):
+            if field in old and field in new and old[field] > 0:
+                memory_change = new[field] / old[field] - 1
+                line += f"  {field} {memory_change:+7.1%}"
+                if memory_change > threshold:
+                    regressions.append(f"{key[0]} {key[1]}: {field} {memory_change:+.1%}")
+        print(line)
+    return regressions
+
+# Main program
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files and report regressions")
+    parser.add_argument('baseline')
+    parser.add_argument('current')
+    parser.add_argument('--threshold', type=float, default=0.2, help="Allowed relative slowdown or memory growth")
+    args = parser.parse_args()
+    regressions = compare(args.baseline, args.current, args.threshold)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    sys.exit(1 if regressions else 0)
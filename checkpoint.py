@@ -0,0 +1,117 @@
+import os
+import json
+import time
+import pickle
+import shutil
+import hashlib
+import logging
+
+# Default location of the scan checkpoints, one directory per scan name, parameter set and symbol list
+CHECKPOINT_DIR = "checkpoints"
+# Unfinished checkpoints older than this are not resumed, the universe and prices have moved on
+MAX_AGE_HOURS = 24
+
+class Checkpoint:
+    """
+    Completed symbols of one scan and their results, appended to disk as the scan goes
+    The symbol list is stored when the scan starts, a scan of other symbols gets a checkpoint of its own
+    """
+    def __init__(self, path, manifest, results):
+        self.path = path
+        self.manifest = manifest
+        self.results = dict(results)
+        self._file = None
+
+    @property
+    def symbols(self):
+        return self.manifest['symbols']
+
+    @property
+    def done(self):
+        return set(self.results)
+
+    def remaining(self):
+        """
+        Symbols of the scan without a stored result, in scan order
+        """
+        return [symbol for symbol in self.symbols if symbol not in self.results]
+
+    def record(self, pairs):
+        """
+        Append (symbol, result) pairs and flush them, so they survive the process being killed
+        """
+        if not pairs:
+            return
+        if self._file is None:
+            self._file = open(os.path.join(self.path, "results.pkl"), 'ab')
+        for symbol, result in pairs:
+            pickle.dump((symbol, result), self._file)
+            self.results[symbol] = result
+        self._file.flush()
+
+    def finish(self):
+        """
+        Mark the scan as completed, a new run with the same parameters starts from scratch
+        """
+        self.close()
+        self.manifest['finished'] = time.time()
+        _write_manifest(self.path, self.manifest)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+def _key(name, params, symbols):
+    digest = hashlib.sha1(json.dumps([params, sorted(symbols)], sort_keys=True, default=str).encode()).hexdigest()[:12]
+    return "".join(c if c.isalnum() else "_" for c in name) + "-" + digest
+
+def _write_manifest(path, manifest):
+    with open(os.path.join(path, "manifest.json.tmp"), 'w') as f:
+        json.dump(manifest, f, default=str)
+    os.replace(os.path.join(path, "manifest.json.tmp"), os.path.join(path, "manifest.json"))
+
+def _read_results(path):
+    """
+    Stored (symbol, result) pairs, a record cut off by a crash at the end of the file is dropped
+    and cut from the file, so new records are appended after the last complete one
+    """
+    results = []
+    file_path = os.path.join(path, "results.pkl")
+    if not os.path.exists(file_path):
+        return results
+    with open(file_path, 'rb') as f:
+        end = 0
+        while True:
+            try:
+                results.append(pickle.load(f))
+                end = f.tell()
+            except EOFError:
+                break
+            except (pickle.UnpicklingError, ValueError, AttributeError, ImportError, IndexError) as e:
+                logging.warning(f"Ignoring a truncated record at the end of {file_path}: {str(e)}")
+                break
+    if end < os.path.getsize(file_path):
+        os.truncate(file_path, end)
+    return results
+
+def open_checkpoint(name, symbols, params=None, resume=True, max_age_hours=MAX_AGE_HOURS, checkpoint_dir=CHECKPOINT_DIR):
+    """
+    Resume the unfinished checkpoint of the same scan name, parameters and symbols, or start a new one
+    """
+    symbols = list(symbols)
+    path = os.path.join(checkpoint_dir, _key(name, params or {}, symbols))
+    manifest_path = os.path.join(path, "manifest.json")
+    if resume and os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        age_hours = (time.time() - manifest['started']) / 3600
+        if manifest.get('finished') is None and age_hours < max_age_hours:
+            checkpoint = Checkpoint(path, manifest, _read_results(path))
+            logging.info(f"Resuming {name} from {path}: {len(checkpoint.results)} of {len(checkpoint.symbols)} symbols done")
+            return checkpoint
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+    manifest = {'name': name, 'params': params or {}, 'started': time.time(), 'finished': None, 'symbols': symbols}
+    _write_manifest(path, manifest)
+    return Checkpoint(path, manifest, [])
@@ -0,0 +1,262 @@
+import time
+import heapq
+import random
+import logging
+import argparse
+import threading
+import requests
+import pandas as pd
+from requests.adapters import HTTPAdapter
+import instrument
+
+# Chart API the daily bars are read from, one request per symbol
+YAHOO_CHART_URL = "https://query2.finance.yahoo.com/v8/finance/chart"
+# Requests per second across every thread using the client, with bursts of up to BURST requests
+RATE = 5.0
+BURST = 10
+# Retries per throttled symbol, each one deferred in the retry queue by the backoff
+MAX_RETRIES = 5
+# Backoff before attempt n is about BACKOFF_BASE * 2 ** n seconds, jittered and capped at BACKOFF_MAX
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+# Connections kept open to the server, enough for the fetch threads of the pipeline
+POOL_SIZE = 16
+TIMEOUT = 30
+USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0 Safari/537.36"
+
+class Throttled(Exception):
+    """
+    Response worth retrying later: 429, a server error, a network error or a result without bars
+    """
+    def __init__(self, message, status=None, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: rate requests per second on average, up to burst at once
+    pause holds back every thread, e.g. when the server answered 429
+    """
+    def __init__(self, rate=RATE, burst=BURST):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        """
+        Take a token if one is available, returns 0 then or the seconds until one will be
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now > self.updated:
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+            if now >= self.updated and self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return max(self.updated - now, 0.0) + max(1 - self.tokens, 0.0) / self.rate
+
+    def acquire(self):
+        """
+        Block until a request may be sent, returns the seconds waited
+        """
+        waited = 0.0
+        while (wait := self.try_acquire()) > 0:
+            time.sleep(wait)
+            waited += wait
+        return waited
+
+    def pause(self, seconds):
+        """
+        Hand out no tokens for the next seconds, the bucket refills from empty afterwards
+        """
+        with self._lock:
+            self.updated = max(self.updated, time.monotonic() + seconds)
+            self.tokens = 0.0
+
+def backoff_delay(attempt, base=BACKOFF_BASE, cap=BACKOFF_MAX):
+    """
+    Exponential backoff with jitter: between half and all of base * 2 ** attempt, at most cap
+    The jitter keeps threads throttled at the same moment from retrying at the same moment
+    """
+    delay = min(cap, base * 2 ** attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+def parse_chart(payload):
+    """
+    DataFrame of daily bars (Open, High, Low, Close, Adj Close, Volume) from a chart API response
+    """
+    result = (payload.get('chart') or {}).get('result') or []
+    if not result or not result[0].get('timestamp'):
+        return pd.DataFrame()
+    result = result[0]
+    quote = result['indicators']['quote'][0]
+    adjclose = (result['indicators'].get('adjclose') or [{}])[0].get('adjclose', quote['close'])
+    # Timestamps are the session open in UTC, shifted to exchange time they fall on the trading day
+    offset = result.get('meta', {}).get('gmtoffset', 0)
+    index = pd.to_datetime([timestamp + offset for timestamp in result['timestamp']], unit='s').normalize()
+    data = pd.DataFrame({
+        'Open': quote['open'],
+        'High': quote['high'],
+        'Low': quote['low'],
+        'Close': quote['close'],
+        'Adj Close': adjclose,
+        'Volume': quote['volume'],
+    }, index=pd.DatetimeIndex(index, name='Date'), dtype='float64')
+    data = data[~data.index.duplicated(keep='last')]
+    return data.dropna(how='all')
+
+def _retry_after(response):
+    try:
+        return float(response.headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+class FetchClient:
+    """
+    Chart API client shared by the fetch threads of a process: one pooled HTTP session,
+    one token bucket for all of them and jittered exponential backoff on 429 or empty responses
+    """
+    def __init__(self, base_url=YAHOO_CHART_URL, rate=RATE, burst=BURST, max_retries=MAX_RETRIES,
+                 backoff_base=BACKOFF_BASE, backoff_max=BACKOFF_MAX, pool_size=POOL_SIZE, timeout=TIMEOUT):
+        self.base_url = base_url.rstrip('/')
+        self.bucket = TokenBucket(rate, burst)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers['User-Agent'] = USER_AGENT
+        # Symbols that could not be fetched by any attempt, for the caller to report
+        self.missing = set()
+
+    def get_bars(self, symbol, start=None):
+        """
+        One request for the daily bars of a symbol from start ('YYYY-MM-DD', None for the full history)
+        Raises Throttled when the request should be retried, an unknown symbol gives an empty DataFrame
+        """
+        self.bucket.acquire()
+        params = {'interval': '1d', 'events': 'div,splits', 'includeAdjustedClose': 'true'}
+        if start is None:
+            params['range'] = 'max'
+        else:
+            params['period1'] = int(pd.Timestamp(start).timestamp())
+            params['period2'] = int(time.time())
+        try:
+            response = self.session.get(f"{self.base_url}/{symbol}", params=params, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise Throttled(f"{type(e).__name__}: {e}")
+        if response.status_code == 429 or response.status_code >= 500:
+            raise Throttled(f"HTTP {response.status_code}", response.status_code, _retry_after(response))
+        if response.status_code == 404:
+            return pd.DataFrame()
+        response.raise_for_status()
+        data = parse_chart(response.json())
+        if data.empty:
+            raise Throttled("empty response", response.status_code)
+        return data
+
+    def fetch_symbol(self, symbol, start=None, attempt=0):
+        """
+        One attempt at the bars of a symbol: (DataFrame, 0) or (None, seconds to back off) when throttled
+        The DataFrame is empty for an unknown symbol or an error
+        A 429 also pauses the bucket for the backoff, so every thread slows down and not only this one
+        """
+        try:
+            return self.get_bars(symbol, start), 0.0
+        except Throttled as e:
+            instrument.count('throttled')
+            delay = max(backoff_delay(attempt, self.backoff_base, self.backoff_max), e.retry_after or 0)
+            logging.debug(f"Fetching {symbol} throttled ({e}), retrying in {delay:.2f} s")
+            if e.status == 429:
+                self.bucket.pause(delay)
+            return None, delay
+        except Exception as e:
+            logging.error(f"Error fetching data for {symbol}: {str(e)}")
+            instrument.count('fetch_errors')
+            return pd.DataFrame(), 0.0
+
+    def fetch(self, symbols, start=None):
+        """
+        Dict of symbol -> DataFrame with one attempt per symbol and pass: a throttled symbol goes to a retry queue
+        and comes back once its backoff is over, so it does not hold up the rest of the chunk
+        The worker only sleeps when every symbol left is waiting out its backoff
+        Symbols still throttled after max_retries retries are logged and counted as missing instead of silently dropped
+        """
+        symbols = list(symbols)
+        frames = {}
+        # (time the symbol may be tried, attempt, position in symbols), earliest first
+        queue = [(0.0, 0, i) for i in range(len(symbols))]
+        while queue:
+            ready, attempt, i = heapq.heappop(queue)
+            wait = ready - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            symbol = symbols[i]
+            if attempt > 0:
+                instrument.count('retries')
+            data, delay = self.fetch_symbol(symbol, start, attempt)
+            if data is None and attempt < self.max_retries:
+                heapq.heappush(queue, (time.monotonic() + delay, attempt + 1, i))
+            elif data is None:
+                logging.warning(f"No data fetched for {symbol}, still throttled after {self.max_retries} retries")
+                instrument.count('missing_symbols')
+                self.missing.add(symbol)
+            elif not data.empty:
+                frames[symbol] = data
+                self.missing.discard(symbol)
+        return frames
+
+    def close(self):
+        self.session.close()
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_client(**kwargs):
+    """
+    Client shared by every caller in this process with the same settings, so they share its bucket and connections
+    """
+    key = tuple(sorted(kwargs.items()))
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = FetchClient(**kwargs)
+        return _clients[key]
+
+# Main program
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Fetch daily bars through the rate limited client")
+    parser.add_argument('symbols', nargs='*', help="Symbols to fetch, defaults to synthetic ones with --stub")
+    parser.add_argument('--stub', action='store_true', help="Fetch from a local stub server that throttles (stub_server.py)")
+    parser.add_argument('--count', type=int, default=200, help="Number of synthetic symbols fetched from the stub")
+    parser.add_argument('--rate', type=float, default=RATE, help="Client requests per second")
+    parser.add_argument('--server-rate', type=float, default=20.0, help="Requests per second the stub allows before answering 429")
+    parser.add_argument('--empty-rate', type=float, default=0.05, help="Share of stub responses without bars")
+    parser.add_argument('--threads', type=int, default=4, help="Fetch threads sharing the client")
+    args = parser.parse_args()
+
+    from concurrent.futures import ThreadPoolExecutor
+    from batch_fetch import chunked
+    from providers import synthetic_symbols
+    from stub_server import StubChartServer
+
+    server = StubChartServer(rate=args.server_rate, empty_rate=args.empty_rate) if args.stub else None
+    base_url = server.start() if server else YAHOO_CHART_URL
+    symbols = args.symbols or list(synthetic_symbols(args.count))
+    client = FetchClient(base_url, rate=args.rate, backoff_base=0.2 if args.stub else BACKOFF_BASE)
+    with instrument.record_run("fetch") as stats, ThreadPoolExecutor(args.threads) as executor:
+        frames = {}
+        for result in executor.map(client.fetch, chunked(symbols, max(1, len(symbols) // (4 * args.threads)))):
+            frames.update(result)
+    logging.info(f"Fetched {len(frames)} of {len(symbols)} symbols, missing: {sorted(client.missing)}")
+    logging.info(stats.summary())
+    if server:
+        logging.info(f"Stub server: {server.stats}")
+        server.stop()
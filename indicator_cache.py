@@ -0,0 +1,211 @@
+import os
+import pickle
+import hashlib
+import logging
+import argparse
+import inspect
+import functools
+import threading
+from collections import OrderedDict
+import numpy as np
+
+# The cache directory is kept in the environment so worker processes use the same cache, unset means no caching
+CACHE_ENV = "INDICATOR_CACHE"
+CACHE_DIR = "indicator_cache"
+# Results kept in memory by each process, least recently used first out
+MEMORY_ENTRIES = 4096
+# Size cap of the disk tier, the least recently used files are removed beyond it
+DISK_LIMIT_MB = 512
+# Eviction removes files until the disk tier is this share of the cap, so it does not run on every write
+EVICT_TO = 0.9
+
+def content_key(name, data, columns, params, context=None):
+    """
+    Hash of the input bars (dates and the columns the indicator reads), its parameters and context
+    Any change to a bar gives a new key, unchanged bars give the same key in every process and run
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr((name, sorted(params.items()), context, list(columns))).encode())
+    digest.update(np.ascontiguousarray(data.index.to_numpy()).tobytes())
+    for column in columns:
+        digest.update(np.ascontiguousarray(data[column].to_numpy(dtype=np.float64)).tobytes())
+    return digest.hexdigest()
+
+class IndicatorCache:
+    """
+    Two tier cache of indicator results: an LRU dict in memory in front of one pickle file per result on disk
+    The disk tier is shared by processes and runs, its files are written atomically and
+    the least recently used ones are removed once the directory exceeds disk_limit_mb
+    """
+    def __init__(self, directory=CACHE_DIR, memory_entries=MEMORY_ENTRIES, disk_limit_mb=DISK_LIMIT_MB):
+        self.directory = directory
+        self.memory_entries = memory_entries
+        self.disk_limit = int(disk_limit_mb * 2 ** 20)
+        self.memory = OrderedDict()
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'evicted': 0}
+        self._disk_bytes = None
+        self._lock = threading.Lock()
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key + ".pkl")
+
+    def get(self, key):
+        """
+        Cached result of key, None on a miss
+        """
+        with self._lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                self.stats['memory_hits'] += 1
+                return self.memory[key]
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+            os.utime(path)  # Mark as recently used for eviction
+        except (OSError, EOFError, pickle.UnpicklingError):
+            with self._lock:
+                self.stats['misses'] += 1
+            return None
+        with self._lock:
+            self.stats['disk_hits'] += 1
+            self._remember(key, value)
+        return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._remember(key, value)
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        size = os.path.getsize(tmp_path)
+        os.replace(tmp_path, path)
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = self.disk_usage()
+            else:
+                self._disk_bytes += size
+            over = self._disk_bytes > self.disk_limit
+        if over:
+            self.evict()
+
+    def _remember(self, key, value):
+        self.memory[key] = value
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_entries:
+            self.memory.popitem(last=False)
+
+    def _files(self):
+        files = []
+        if not os.path.isdir(self.directory):
+            return files
+        for shard in os.scandir(self.directory):
+            if shard.is_dir():
+                for entry in os.scandir(shard.path):
+                    if entry.name.endswith('.pkl'):
+                        try:
+                            stat = entry.stat()
+                        except FileNotFoundError:  # Evicted by another process meanwhile
+                            continue
+                        files.append((stat.st_mtime, stat.st_size, entry.path))
+        return files
+
+    def disk_usage(self):
+        return sum(size for _, size, _ in self._files())
+
+    def evict(self):
+        """
+        Remove the least recently used files until the disk tier is below EVICT_TO of its cap
+        """
+        files = sorted(self._files())
+        total = sum(size for _, size, _ in files)
+        removed = 0
+        for _, size, path in files:
+            if total <= self.disk_limit * EVICT_TO:
+                break
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+        with self._lock:
+            self._disk_bytes = total
+            self.stats['evicted'] += removed
+
+    def clear(self):
+        with self._lock:
+            self.memory.clear()
+        for _, _, path in self._files():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        self._disk_bytes = 0
+
+_cache = None
+
+def set_cache(directory=CACHE_DIR):
+    """
+    Cache the indicator functions in directory, None turns caching off
+    """
+    if directory is None:
+        os.environ.pop(CACHE_ENV, None)
+    else:
+        os.environ[CACHE_ENV] = directory
+
+def get_cache():
+    """
+    Cache of this process for the directory in the environment, None when caching is off
+    """
+    global _cache
+    directory = os.environ.get(CACHE_ENV)
+    if not directory:
+        return None
+    if _cache is None or _cache.directory != directory:
+        _cache = IndicatorCache(directory)
+    return _cache
+
+def cached(name, columns, context=None):
+    """
+    Decorator caching an indicator function of (data, **params) on the content of the columns it reads
+    context is an optional callable whose value is part of the key, e.g. the selected engine
+    Callers get a copy of DataFrame and Series results, so changing one does not change the cached one
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(data, *args, **kwargs):
+            cache = get_cache()
+            if cache is None:
+                return func(data, *args, **kwargs)
+            bound = signature.bind(data, *args, **kwargs)
+            bound.apply_defaults()
+            params = dict(list(bound.arguments.items())[1:])
+            key = content_key(name, data, columns, params, context() if context else None)
+            value = cache.get(key)
+            if value is None:
+                value = func(data, *args, **kwargs)
+                try:
+                    cache.put(key, value)
+                except OSError as e:
+                    logging.warning(f"Could not cache {name}: {str(e)}")
+            return value.copy() if hasattr(value, 'copy') else value
+        return wrapper
+    return decorator
+
+# Main program
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Inspect or clear the indicator result cache")
+    parser.add_argument('--dir', default=os.environ.get(CACHE_ENV) or CACHE_DIR, help="Cache directory")
+    parser.add_argument('--clear', action='store_true', help="Remove every cached result")
+    args = parser.parse_args()
+    cache = IndicatorCache(args.dir)
+    if args.clear:
+        cache.clear()
+    files = cache._files()
+    logging.info(f"{args.dir}: {len(files)} cached results, {sum(size for _, size, _ in files) / 2 ** 20:.1f} MB")
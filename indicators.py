@@ -0,0 +1,170 @@
+import os
+import pandas as pd
+import numpy as np
+from indicator_cache import cached
+
+# Weight left on the bars before the lookback window, small enough that the last EMA values have converged
+EMA_TOLERANCE = 1e-6
+# Number of most recent bars a scan evaluates the signal on
+SIGNAL_DAYS = 5
+# get_rsi, get_macd, get_kdj and get_vol_ratio run on pandas or on the array kernels of kernels.py
+ENGINES = ('pandas', 'numpy', 'numba')
+# The engine is kept in the environment so worker processes use the same one
+ENGINE_ENV = "INDICATOR_ENGINE"
+
+def set_engine(name):
+    """
+    Select the implementation of the indicator functions: 'pandas' (default), 'numpy' or 'numba'
+    """
+    if name not in ENGINES:
+        raise ValueError(f"Unknown indicator engine: {name}")
+    if name != 'pandas':
+        import kernels
+        kernels.set_backend(name)
+    os.environ[ENGINE_ENV] = name
+
+def get_engine():
+    return os.environ.get(ENGINE_ENV, 'pandas')
+
+def _kernels():
+    """
+    kernels module set to the selected backend, None for the pandas engine
+    """
+    engine = get_engine()
+    if engine == 'pandas':
+        return None
+    import kernels
+    kernels.set_backend(engine)
+    return kernels
+
+@cached('rsi', ['Adj Close'], context=get_engine)
+def get_rsi(data, period=14):
+    """
+    Calculate RSI indicator
+    """
+    kernels = _kernels()
+    if kernels is not None:
+        return pd.Series(kernels.rsi(data['Adj Close'], period), index=data.index, name='Adj Close')
+    delta = data['Adj Close'].diff()
+    up = delta.where(delta > 0, 0)
+    down = -delta.where(delta < 0, 0)
+    avg_gain = up.rolling(window=period).mean()
+    avg_loss = down.rolling(window=period).mean()
+    rs = avg_gain / avg_loss
+    rsi = 100 - (100 / (1 + rs))
+    return rsi
+
+@cached('macd', ['Adj Close'], context=get_engine)
+def get_macd(data, short_period=12, long_period=26, signal_period=9):
+    """
+    Calculate MACD indicator for given stock data
+    """
+    kernels = _kernels()
+    if kernels is not None:
+        macd, signal = kernels.macd(data['Adj Close'], short_period, long_period, signal_period)
+        return pd.DataFrame({'MACD': macd, 'Signal': signal}, index=data.index)
+    short_ema = data['Adj Close'].ewm(span=short_period, adjust=False).mean()
+    long_ema = data['Adj Close'].ewm(span=long_period, adjust=False).mean()
+    macd = short_ema - long_ema
+    signal = macd.ewm(span=signal_period, adjust=False).mean()
+    return pd.DataFrame({'MACD': macd, 'Signal': signal}, index=data.index)
+
+@cached('kdj', ['High', 'Low', 'Close'], context=get_engine)
+def get_kdj(data, n=9, m1=3, m2=3):
+    """
+    Calculate KDJ indicator for given stock data
+    """
+    kernels = _kernels()
+    if kernels is not None:
+        k, d, j = kernels.kdj(data['High'], data['Low'], data['Close'], n, m1, m2)
+        return pd.DataFrame({'K': k, 'D': d, 'J': j}, index=data.index)
+    low_min = data['Low'].rolling(window=n).min()
+    high_max = data['High'].rolling(window=n).max()
+    rsv = (data['Close'] - low_min) / (high_max - low_min) * 100
+    k = rsv.ewm(span=m1, adjust=False).mean()
+    d = k.ewm(span=m2, adjust=False).mean()
+    j = 3 * k - 2 * d
+    return pd.DataFrame({'K': k, 'D': d, 'J': j}, index=data.index)
+
+@cached('vol', ['Volume'], context=get_engine)
+def get_vol_ratio(data, n=20):
+    """
+    Calculate the ratio of the volume to its n-day average
+    """
+    kernels = _kernels()
+    if kernels is not None:
+        return pd.Series(kernels.vol_ratio(data['Volume'], n), index=data.index, name='Volume')
+    vol_avg = data['Volume'].rolling(window=n).mean()
+    return data['Volume'] / vol_avg
+
+def get_rsi_signal(data, period=14, buy_threshold=20, sell_threshold=80):
+    """
+    Generate trading signals based on RSI indicator
+    """
+    rsi = get_rsi(data, period)
+    return pd.Series(np.select([rsi < buy_threshold, rsi > sell_threshold], ['Buy', 'Sell'], ''), index=data.index)
+
+def get_cross_signal(fast, slow, buy_condition=True, sell_condition=True):
+    """
+    Buy when the fast line crosses above the slow line, Sell when it crosses below
+    """
+    cross_above = (fast.shift(1) <= slow.shift(1)) & (fast > slow)
+    cross_below = (fast.shift(1) >= slow.shift(1)) & (fast < slow)
+    return pd.Series(np.select([cross_above & buy_condition, cross_below & sell_condition], ['Buy', 'Sell'], ''), index=fast.index)
+
+def get_macd_signal(data, short_period=12, long_period=26, signal_period=9):
+    """
+    Generate trading signals based on MACD indicator
+    """
+    macd_data = get_macd(data, short_period, long_period, signal_period)
+    return get_cross_signal(macd_data['MACD'], macd_data['Signal'])
+
+def get_kdj_signal(data, n=9, m1=3, m2=3, buy_threshold=20, sell_threshold=80):
+    """
+    Generate trading signals based on KDJ indicator
+    """
+    kdj_data = get_kdj(data, n, m1, m2)
+    return get_cross_signal(kdj_data['K'], kdj_data['D'], kdj_data['J'] > buy_threshold, kdj_data['J'] < sell_threshold)
+
+def get_vol_signal(data, n=20, buy_threshold=1.5, sell_threshold=0.5):
+    """
+    Generate trading signals based on volume indicator
+    """
+    vol_ratio = get_vol_ratio(data, n)
+
+    buy_signal = vol_ratio > buy_threshold
+    sell_signal = vol_ratio < sell_threshold
+
+    return pd.Series(np.select([buy_signal, sell_signal], ['Buy', 'Sell'], ''), index=data.index)
+
+def ema_warmup(span, tolerance=EMA_TOLERANCE):
+    """
+    Number of bars after which an EMA (adjust=False) has forgotten its starting value up to tolerance
+    """
+    alpha = 2 / (span + 1)
+    return int(np.ceil(np.log(tolerance) / np.log(1 - alpha)))
+
+def min_history(indicator, days=SIGNAL_DAYS, tolerance=EMA_TOLERANCE, **params):
+    """
+    Minimum number of bars that gives converged values for the last days bars of an indicator
+    Threshold parameters are accepted and ignored so a scan can pass its full parameter set
+      rsi:  period differences, the rolling means are exact
+      macd: EMA warm-up of the long period plus the signal period, one extra bar for the crossing
+      kdj:  n-1 bars for the first RSV plus the m1 and m2 EMA warm-ups, one extra bar for the crossing
+      vol:  n bars for the rolling average
+    """
+    if indicator == 'rsi':
+        return params.get('period', 14) + days
+    elif indicator == 'macd':
+        return ema_warmup(params.get('long_period', 26), tolerance) + ema_warmup(params.get('signal_period', 9), tolerance) + days + 1
+    elif indicator == 'kdj':
+        return params.get('n', 9) - 1 + ema_warmup(params.get('m1', 3), tolerance) + ema_warmup(params.get('m2', 3), tolerance) + days + 1
+    elif indicator == 'vol':
+        return params.get('n', 20) + days - 1
+    raise ValueError(f"Unknown indicator: {indicator}")
+
+def tail_window(data, indicator, days=SIGNAL_DAYS, **params):
+    """
+    Last bars of data that are needed to evaluate an indicator on its last days bars
+    """
+    return data.tail(min_history(indicator, days, **params))
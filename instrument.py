@@ -0,0 +1,204 @@
+import os
+import json
+import time
+import logging
+import threading
+import contextlib
+from collections import defaultdict
+
+# Directory the run reports of the scanners are written to
+REPORT_DIR = "reports"
+# Environment variable holding a profile dump path, so the scanner scripts can be profiled without flags
+PROFILE_ENV = "SCAN_PROFILE"
+
+class RunStats:
+    """
+    Per-symbol and aggregate stage timings and counters of one scan run
+    """
+    def __init__(self, name):
+        self.name = name
+        self.started = time.time()
+        self.wall_seconds = None
+        self.stage_seconds = defaultdict(float)
+        self.stage_calls = defaultdict(int)
+        self.symbol_seconds = defaultdict(lambda: defaultdict(float))
+        self.counters = defaultdict(int)
+        self.samples = defaultdict(list)
+        self.profile_path = None
+        self._lock = threading.Lock()
+
+    def add_time(self, stage, seconds, symbols=()):
+        """
+        Record seconds spent in a stage, shared equally by the given symbols
+        """
+        with self._lock:
+            self.stage_seconds[stage] += seconds
+            self.stage_calls[stage] += 1
+            for symbol in symbols:
+                self.symbol_seconds[symbol][stage] += seconds / len(symbols)
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+
+    def observe(self, name, value):
+        """
+        Record one sample of a distribution that is not a stage, e.g. task latency
+        """
+        with self._lock:
+            self.samples[name].append(value)
+
+    def report(self):
+        """
+        Structured run report: totals per stage, percentiles over symbols, counters and the slowest symbols
+        Stage seconds are summed over threads and processes, so share of wall time exceeds 1 for parallel stages
+        """
+        stages = {}
+        for stage, seconds in self.stage_seconds.items():
+            per_symbol = sorted(times[stage] for times in self.symbol_seconds.values() if stage in times)
+            stages[stage] = {
+                'seconds': seconds,
+                'calls': self.stage_calls[stage],
+                'share': seconds / self.wall_seconds if self.wall_seconds else None,
+                'symbol_p50': _percentile(per_symbol, 0.5),
+                'symbol_p95': _percentile(per_symbol, 0.95),
+                'symbol_max': per_symbol[-1] if per_symbol else None,
+            }
+        totals = {symbol: sum(times.values()) for symbol, times in self.symbol_seconds.items()}
+        slowest = sorted(totals, key=totals.get, reverse=True)[:20]
+        return {
+            'name': self.name,
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started)),
+            'wall_seconds': self.wall_seconds,
+            'symbols': len(self.symbol_seconds),
+            'stages': stages,
+            'counters': dict(self.counters),
+            'distributions': {name: {'count': len(values), 'p50': _percentile(sorted(values), 0.5),
+                                     'p95': _percentile(sorted(values), 0.95), 'max': max(values)}
+                              for name, values in self.samples.items()},
+            'slowest_symbols': {symbol: dict(self.symbol_seconds[symbol]) for symbol in slowest},
+            'profile': self.profile_path,
+        }
+
+    def summary(self):
+        """
+        One line per stage for the log
+        """
+        report = self.report()
+        lines = [f"{self.name}: {report['symbols']} symbols in {report['wall_seconds'] or 0:.2f} s"]
+        for stage, item in sorted(report['stages'].items()):
+            lines.append(f"  {stage:18s} {item['seconds']:10.2f} s  {item['share'] or 0:7.1%} of wall  p95/symbol {item['symbol_p95'] or 0:.4f} s")
+        for name, item in sorted(report['distributions'].items()):
+            lines.append(f"  {name:18s} p50 {item['p50']:.4f} s  p95 {item['p95']:.4f} s  max {item['max']:.4f} s")
+        if report['counters']:
+            lines.append("  " + ", ".join(f"{name}={n}" for name, n in sorted(report['counters'].items())))
+        return "\n".join(lines)
+
+    def save(self, path=None):
+        """
+        Write the run report as JSON, by default to reports/<name>-<timestamp>.json
+        """
+        if path is None:
+            os.makedirs(REPORT_DIR, exist_ok=True)
+            path = os.path.join(REPORT_DIR, f"{self.name}-{time.strftime('%Y%m%d-%H%M%S', time.localtime(self.started))}.json")
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+        return path
+
+def _percentile(values, q):
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+_current = None
+
+def current():
+    """
+    Stats of the run being recorded, None outside record_run
+    """
+    return _current
+
+@contextlib.contextmanager
+def timer(stage, symbols=()):
+    """
+    Time a block as one stage of the current run, does nothing outside record_run
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if _current is not None:
+            _current.add_time(stage, time.perf_counter() - start, symbols)
+
+def count(name, n=1):
+    """
+    Increment a counter of the current run, does nothing outside record_run
+    """
+    if _current is not None:
+        _current.count(name, n)
+
+@contextlib.contextmanager
+def record_run(name, profile=None):
+    """
+    Record stage timings and counters of everything run inside the block
+    profile is an optional path for a profile dump of the main process, pyinstrument
+    is used for .html paths when it is installed, cProfile otherwise, defaults to $SCAN_PROFILE
+    """
+    global _current
+    profile = profile or os.environ.get(PROFILE_ENV)
+    stats = RunStats(name)
+    previous, _current = _current, stats
+    profiler = None
+    if profile:
+        if profile.endswith('.html'):
+            try:
+                from pyinstrument import Profiler
+                profiler = Profiler()
+            except ImportError:
+                logging.warning("pyinstrument is not installed, writing a cProfile dump instead")
+                profile = profile[:-len('.html')] + '.prof'
+        if profiler is None:
+            import cProfile
+            profiler = cProfile.Profile()
+        profiler.enable() if hasattr(profiler, 'enable') else profiler.start()
+    start = time.perf_counter()
+    try:
+        yield stats
+    finally:
+        stats.wall_seconds = time.perf_counter() - start
+        if profiler is not None:
+            if hasattr(profiler, 'dump_stats'):
+                profiler.disable()
+                profiler.dump_stats(profile)
+            else:
+                profiler.stop()
+                with open(profile, 'w') as f:
+                    f.write(profiler.output_html())
+            stats.profile_path = profile
+        _current = previous
+
+class _ErrorCounter(logging.Handler):
+    """
+    Counts the errors logged in a worker process, e.g. the exceptions process_stock turns into log lines
+    """
+    def __init__(self):
+        super().__init__(level=logging.ERROR)
+        self.errors = 0
+
+    def emit(self, record):
+        self.errors += 1
+
+_error_counter = None
+
+def timed_call(func, *args):
+    """
+    Run func in a worker and return (result, seconds, errors logged during the call)
+    """
+    global _error_counter
+    if _error_counter is None:
+        _error_counter = _ErrorCounter()
+        logging.getLogger().addHandler(_error_counter)
+    errors_before = _error_counter.errors
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start, _error_counter.errors - errors_before
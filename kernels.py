@@ -0,0 +1,359 @@
+import argparse
+import functools
+import numpy as np
+
+# Numba is optional, without it the kernels run as vectorized NumPy
+try:
+    import numba
+except ImportError:
+    numba = None
+
+BACKENDS = ('numba', 'numpy')
+# Largest factor the block-wise NumPy EMA scales a value by, bounds its rounding error
+EMA_BLOCK_GROWTH = 1e3
+
+def _jit(func):
+    return numba.njit(cache=True)(func) if numba is not None else func
+
+_backend = 'numba' if numba is not None else 'numpy'
+
+def set_backend(name):
+    """
+    Select the kernels used from now on: 'numba' (compiled loops) or 'numpy'
+    """
+    global _backend
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown kernel backend: {name}")
+    if name == 'numba' and numba is None:
+        raise ImportError("numba is not installed, use the 'numpy' backend")
+    _backend = name
+
+def get_backend():
+    return _backend
+
+def _as_array(values):
+    return np.ascontiguousarray(values, dtype=np.float64)
+
+# Compiled single-pass loops
+
+@functools.lru_cache(maxsize=None)
+def gap_weights(span):
+    """
+    Whether the installed pandas gives a value after missing ones the weight of every period since the last value,
+    1 - (1 - alpha) ** gap, in ewm(span=span, adjust=False).mean(), or only alpha
+    pandas 2 always gives alpha, pandas 3 the whole gap for some spans (span 3 of the KDJ), so it is probed once per span
+    """
+    import pandas as pd
+    alpha = 2 / (span + 1)
+    value = pd.Series([0.0, np.nan, 1.0]).ewm(span=span, adjust=False).mean().iloc[-1]
+    return not np.isclose(value, alpha / ((1 - alpha) ** 2 + alpha), rtol=1e-12, atol=0)
+
+def ema_step(value, old_wt, x, alpha, gap_weights):
+    """
+    One step of ewm(adjust=False).mean() from the last average and the weight left of it
+    Missing values decay the old weight, the next value then gets the rest of it with gap_weights or only alpha
+    """
+    if value != value:
+        if x == x:
+            return x, 1.0
+        return value, old_wt
+    old_wt *= 1 - alpha
+    if x == x:
+        if value != x:
+            if gap_weights:
+                value = old_wt * value + (1 - old_wt) * x
+            else:
+                value = (old_wt * value + alpha * x) / (old_wt + alpha)
+        old_wt = 1.0
+    return value, old_wt
+
+_ema_step = _jit(ema_step)
+
+@_jit
+def _ema_loop(x, alpha, gap_weights, out):
+    value, old_wt = np.nan, 1.0
+    for i in range(len(x)):
+        value, old_wt = _ema_step(value, old_wt, x[i], alpha, gap_weights)
+        out[i] = value
+
+@_jit
+def _compensated_add(total, compensation, value):
+    """
+    Kahan summation step, keeps running window sums from drifting over long histories
+    """
+    y = value - compensation
+    t = total + y
+    return t, (t - total) - y
+
+@_jit
+def _gain_loss(close, i):
+    """
+    Gain and loss of bar i, a missing close or the first bar counts as no change like delta.where(delta > 0, 0)
+    """
+    if i == 0:
+        return 0.0, 0.0
+    delta = close[i] - close[i - 1]
+    if delta > 0:
+        return delta, 0.0
+    if delta < 0:
+        return 0.0, -delta
+    return 0.0, 0.0
+
+@_jit
+def _rsi_loop(close, period, out):
+    gain, gain_c, gains = 0.0, 0.0, 0
+    loss, loss_c, losses = 0.0, 0.0, 0
+    for i in range(len(close)):
+        up, down = _gain_loss(close, i)
+        gain, gain_c = _compensated_add(gain, gain_c, up)
+        loss, loss_c = _compensated_add(loss, loss_c, down)
+        gains += up != 0
+        losses += down != 0
+        if i >= period:
+            up, down = _gain_loss(close, i - period)
+            gain, gain_c = _compensated_add(gain, gain_c, -up)
+            loss, loss_c = _compensated_add(loss, loss_c, -down)
+            gains -= up != 0
+            losses -= down != 0
+        if i < period - 1:
+            out[i] = np.nan
+            continue
+        # Windows without any move are exactly zero, not a rounding remainder
+        avg_gain = gain / period if gains else 0.0
+        avg_loss = loss / period if losses else 0.0
+        if avg_loss == 0:
+            out[i] = np.nan if avg_gain == 0 else 100.0
+        else:
+            out[i] = 100 - 100 / (1 + avg_gain / avg_loss)
+
+@_jit
+def _macd_loop(close, alpha_short, alpha_long, alpha_signal, gaps_short, gaps_long, gaps_signal, macd, signal):
+    short, short_wt = np.nan, 1.0
+    long, long_wt = np.nan, 1.0
+    line, line_wt = np.nan, 1.0
+    for i in range(len(close)):
+        short, short_wt = _ema_step(short, short_wt, close[i], alpha_short, gaps_short)
+        long, long_wt = _ema_step(long, long_wt, close[i], alpha_long, gaps_long)
+        macd[i] = short - long
+        line, line_wt = _ema_step(line, line_wt, macd[i], alpha_signal, gaps_signal)
+        signal[i] = line
+
+@_jit
+def _kdj_loop(high, low, close, n, alpha1, alpha2, gaps1, gaps2, k, d, j):
+    k_value, k_wt = np.nan, 1.0
+    d_value, d_wt = np.nan, 1.0
+    for i in range(len(close)):
+        rsv = np.nan
+        if i >= n - 1:
+            low_min = np.inf
+            high_max = -np.inf
+            for t in range(i - n + 1, i + 1):
+                if low[t] != low[t] or high[t] != high[t]:
+                    low_min = np.nan
+                    break
+                low_min = min(low_min, low[t])
+                high_max = max(high_max, high[t])
+            if low_min == low_min:
+                spread = high_max - low_min
+                if spread != 0:
+                    rsv = (close[i] - low_min) / spread * 100
+                elif close[i] != low_min:
+                    rsv = np.inf if close[i] > low_min else -np.inf
+        k_value, k_wt = _ema_step(k_value, k_wt, rsv, alpha1, gaps1)
+        d_value, d_wt = _ema_step(d_value, d_wt, k_value, alpha2, gaps2)
+        k[i] = k_value
+        d[i] = d_value
+        j[i] = 3 * k_value - 2 * d_value
+
+@_jit
+def _vol_ratio_loop(volume, n, out):
+    total, compensation, missing, nonzero = 0.0, 0.0, 0, 0
+    for i in range(len(volume)):
+        if volume[i] != volume[i]:
+            missing += 1
+        else:
+            total, compensation = _compensated_add(total, compensation, volume[i])
+            nonzero += volume[i] != 0
+        if i >= n:
+            old = volume[i - n]
+            if old != old:
+                missing -= 1
+            else:
+                total, compensation = _compensated_add(total, compensation, -old)
+                nonzero -= old != 0
+        if i < n - 1 or missing:
+            out[i] = np.nan
+        elif nonzero == 0:
+            out[i] = np.nan if volume[i] == 0 else np.inf
+        else:
+            out[i] = volume[i] / (total / n)
+
+# Vectorized NumPy versions
+
+def _rolling(x, n):
+    """
+    Windows of the last n values ending at every bar, None if x is shorter than n
+    """
+    if len(x) < n:
+        return None
+    return np.lib.stride_tricks.sliding_window_view(x, n)
+
+def _rolling_stat(x, n, stat):
+    out = np.full(len(x), np.nan)
+    windows = _rolling(x, n)
+    if windows is not None:
+        out[n - 1:] = stat(windows, axis=1)
+    return out
+
+def _ema_numpy(x, span):
+    """
+    ewm(span=span, adjust=False).mean() in blocks: inside a block the recursion is a scaled cumsum,
+    only the carry between blocks is sequential
+    Series with gaps after their first value fall back to the exact loop
+    """
+    alpha = 2 / (span + 1)
+    beta = 1 - alpha
+    out = np.full(len(x), np.nan)
+    valid = ~np.isnan(x)
+    if not valid.any():
+        return out
+    first = int(np.argmax(valid))
+    if not valid[first:].all():
+        _ema_loop(x, alpha, gap_weights(span), out)
+        return out
+    z = x[first:] * alpha
+    z[0] = x[first]
+    if beta == 0:
+        out[first:] = z
+        return out
+    size = len(z)
+    block = max(1, min(size, int(np.log(EMA_BLOCK_GROWTH) / -np.log(beta))))
+    blocks = np.concatenate([z, np.zeros(-size % block)]).reshape(-1, block)
+    powers = beta ** np.arange(block)
+    partial = np.cumsum(blocks / powers, axis=1) * powers
+    starts = np.empty(len(blocks))
+    carry = 0.0
+    decay = beta ** block
+    for b, end in enumerate(partial[:, -1]):
+        starts[b] = carry
+        carry = end + decay * carry
+    out[first:] = (partial + starts[:, None] * (powers * beta)).ravel()[:size]
+    return out
+
+def _rsi_numpy(close, period):
+    delta = np.diff(close, prepend=np.nan)
+    gain = _rolling_stat(np.where(delta > 0, delta, 0.0), period, np.mean)
+    loss = _rolling_stat(np.where(delta < 0, -delta, 0.0), period, np.mean)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return 100 - 100 / (1 + gain / loss)
+
+def _kdj_numpy(high, low, close, n, m1, m2):
+    low_min = _rolling_stat(low, n, np.min)
+    high_max = _rolling_stat(high, n, np.max)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rsv = (close - low_min) / (high_max - low_min) * 100
+    k = _ema_numpy(rsv, m1)
+    d = _ema_numpy(k, m2)
+    return k, d, 3 * k - 2 * d
+
+# Public kernels, arrays in and arrays out
+
+def rsi(close, period=14):
+    """
+    RSI of a close array, same values as indicators.get_rsi
+    """
+    close = _as_array(close)
+    if _backend == 'numba':
+        out = np.empty(len(close))
+        _rsi_loop(close, period, out)
+        return out
+    return _rsi_numpy(close, period)
+
+def macd(close, short_period=12, long_period=26, signal_period=9):
+    """
+    MACD and signal line of a close array, same values as indicators.get_macd
+    """
+    close = _as_array(close)
+    if _backend == 'numba':
+        line, signal = np.empty(len(close)), np.empty(len(close))
+        _macd_loop(close, 2 / (short_period + 1), 2 / (long_period + 1), 2 / (signal_period + 1),
+                   gap_weights(short_period), gap_weights(long_period), gap_weights(signal_period), line, signal)
+        return line, signal
+    line = _ema_numpy(close, short_period) - _ema_numpy(close, long_period)
+    return line, _ema_numpy(line, signal_period)
+
+def kdj(high, low, close, n=9, m1=3, m2=3):
+    """
+    K, D and J of high, low and close arrays, same values as indicators.get_kdj
+    """
+    high, low, close = _as_array(high), _as_array(low), _as_array(close)
+    if _backend == 'numba':
+        k, d, j = np.empty(len(close)), np.empty(len(close)), np.empty(len(close))
+        _kdj_loop(high, low, close, n, 2 / (m1 + 1), 2 / (m2 + 1), gap_weights(m1), gap_weights(m2), k, d, j)
+        return k, d, j
+    return _kdj_numpy(high, low, close, n, m1, m2)
+
+def vol_ratio(volume, n=20):
+    """
+    Volume to n-day average volume ratio, same values as indicators.get_vol_ratio
+    """
+    volume = _as_array(volume)
+    if _backend == 'numba':
+        out = np.empty(len(volume))
+        _vol_ratio_loop(volume, n, out)
+        return out
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return volume / _rolling_stat(volume, n, np.mean)
+
+def check_equivalence(data, rtol=1e-9, atol=1e-9):
+    """
+    Compare the kernels of the current backend with the pandas indicator functions on one symbol
+    Returns the largest absolute difference of every output, raises AssertionError on a mismatch
+    """
+    import indicators
+    if indicators.get_engine() != 'pandas':
+        raise RuntimeError("The reference values need the pandas indicator engine")
+    reference = {
+        'rsi': indicators.get_rsi(data).to_numpy(),
+        'macd': indicators.get_macd(data)['MACD'].to_numpy(),
+        'macd_signal': indicators.get_macd(data)['Signal'].to_numpy(),
+        'kdj_k': indicators.get_kdj(data)['K'].to_numpy(),
+        'kdj_d': indicators.get_kdj(data)['D'].to_numpy(),
+        'kdj_j': indicators.get_kdj(data)['J'].to_numpy(),
+        'vol_ratio': indicators.get_vol_ratio(data).to_numpy(),
+    }
+    k, d, j = kdj(data['High'], data['Low'], data['Close'])
+    line, signal = macd(data['Adj Close'])
+    result = {
+        'rsi': rsi(data['Adj Close']),
+        'macd': line,
+        'macd_signal': signal,
+        'kdj_k': k,
+        'kdj_d': d,
+        'kdj_j': j,
+        'vol_ratio': vol_ratio(data['Volume']),
+    }
+    differences = {}
+    for name, expected in reference.items():
+        np.testing.assert_allclose(result[name], expected, rtol=rtol, atol=atol, err_msg=f"{_backend} {name}")
+        both = ~np.isnan(expected)
+        differences[name] = float(np.abs(result[name][both] - expected[both]).max()) if both.any() else 0.0
+    return differences
+
+# Main program
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the kernels against the pandas indicator functions on synthetic data")
+    parser.add_argument('--backends', nargs='+', default=[name for name in BACKENDS if name != 'numba' or numba is not None],
+                        choices=BACKENDS)
+    parser.add_argument('--symbols', type=int, default=20, help="Number of synthetic symbols to check")
+    parser.add_argument('--bars', type=int, default=2500)
+    args = parser.parse_args()
+    from providers import SyntheticProvider, synthetic_symbols
+    frames = SyntheticProvider(bars=args.bars).fetch(synthetic_symbols(args.symbols))
+    for backend in args.backends:
+        set_backend(backend)
+        worst = {}
+        for data in frames.values():
+            for name, difference in check_equivalence(data).items():
+                worst[name] = max(worst.get(name, 0.0), difference)
+        print(f"{backend:6s} " + "  ".join(f"{name} {difference:.1e}" for name, difference in worst.items()))
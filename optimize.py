@@ -0,0 +1,158 @@
+import pandas as pd
+import itertools
+import random
+import time
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import cpu_count
+import price_store
+import shared_panel
+from universe import get_sp500_symbols
+from backtest import backtest, summarize
+from panel import (build_panel, align_bars, panel_rsi, panel_macd_line, panel_rsv, panel_kdj, panel_vol_ratio,
+                   panel_cross_signal, panel_threshold_signal)
+
+# Parameter values searched for every indicator
+PARAM_GRID = {
+    'rsi': {'period': [9, 14, 21], 'buy_threshold': [10, 20, 30], 'sell_threshold': [70, 80, 90]},
+    'macd': {'short_period': [8, 12], 'long_period': [21, 26], 'signal_period': [5, 9]},
+    'kdj': {'n': [9, 14], 'm1': [3, 5], 'm2': [3, 5], 'buy_threshold': [0, 20, 50], 'sell_threshold': [50, 80, 100]},
+    'vol': {'n': [10, 20], 'buy_threshold': [1.5, 2.0, 3.0], 'sell_threshold': [0.3, 0.5]},
+}
+
+# Parameters that change the indicator values, the first one keys the intermediates shared by a task
+PERIOD_PARAMS = {
+    'rsi': ('period',),
+    'macd': ('short_period', 'long_period', 'signal_period'),
+    'kdj': ('n', 'm1', 'm2'),
+    'vol': ('n',),
+}
+
+# Backtest summary column the parameter sets are ranked by
+SCORE = 'Median Total Return'
+
+def parameter_sets(indicator, grid=None, samples=None, seed=0):
+    """
+    Every combination of the grid, or a random sample of them
+    """
+    grid = grid or PARAM_GRID[indicator]
+    names = list(grid)
+    combos = [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+    if indicator == 'macd':
+        combos = [combo for combo in combos if combo['short_period'] < combo['long_period']]
+    if samples is not None and samples < len(combos):
+        combos = random.Random(seed).sample(combos, samples)
+    return combos
+
+def group_tasks(indicator, combos):
+    """
+    Group the parameter sets by their first period parameter, each group is one task
+    """
+    key = PERIOD_PARAMS[indicator][0]
+    groups = {}
+    for combo in combos:
+        groups.setdefault(combo[key], []).append(combo)
+    return list(groups.values())
+
+def _period_key(indicator, combo):
+    return tuple(combo[name] for name in PERIOD_PARAMS[indicator])
+
+def _signals(indicator, panel, combos):
+    """
+    Yield (params, signal codes) for a group of parameter sets, computing each intermediate once
+      rsi:  one RSI per period, thresholds reuse it
+      macd: one MACD line per (short, long), signal periods reuse it
+      kdj:  one rolling min/max RSV per n, one K/D/J per (m1, m2), thresholds reuse them
+      vol:  one volume ratio per n, thresholds reuse it
+    """
+    close = panel['Adj Close']
+    values = {}
+    if indicator == 'kdj':
+        rsv = panel_rsv(panel['High'], panel['Low'], panel['Close'], combos[0]['n'])
+    elif indicator == 'macd':
+        macd_lines = {}
+    for combo in combos:
+        key = _period_key(indicator, combo)
+        if key not in values:
+            if indicator == 'rsi':
+                values[key] = panel_rsi(close, combo['period'])
+            elif indicator == 'macd':
+                line_key = (combo['short_period'], combo['long_period'])
+                if line_key not in macd_lines:
+                    macd_lines[line_key] = panel_macd_line(close, *line_key)
+                macd = macd_lines[line_key]
+                values[key] = (macd, macd.ewm(span=combo['signal_period'], adjust=False).mean())
+            elif indicator == 'kdj':
+                values[key] = panel_kdj(None, None, None, combo['n'], combo['m1'], combo['m2'], rsv=rsv)
+            elif indicator == 'vol':
+                values[key] = panel_vol_ratio(panel['Volume'], combo['n'])
+        value = values[key]
+        if indicator == 'rsi':
+            yield combo, panel_threshold_signal(value, value < combo['buy_threshold'], value > combo['sell_threshold'])
+        elif indicator == 'macd':
+            yield combo, panel_cross_signal(*value)
+        elif indicator == 'kdj':
+            k, d, j = value
+            yield combo, panel_cross_signal(k, d, j > combo['buy_threshold'], j < combo['sell_threshold'])
+        elif indicator == 'vol':
+            yield combo, panel_threshold_signal(value, value > combo['buy_threshold'], value < combo['sell_threshold'])
+
+def run_task(indicator, combos, fee=0.0):
+    """
+    Backtest one group of parameter sets on the shared price panel the worker is attached to
+    """
+    panel = shared_panel.worker_panel()
+    rows = []
+    for combo, signals in _signals(indicator, panel, combos):
+        metrics = summarize(backtest(panel['Adj Close'], signals, fee))
+        rows.append({'Indicator': indicator.upper(), **combo, **metrics.to_dict()})
+    return rows
+
+def sweep(panel, indicator, grid=None, samples=None, seed=0, fee=0.0, max_workers=None, score=SCORE):
+    """
+    Grid search (or random search with samples) over the parameters of one indicator
+    The panel is aligned by bar position (panel.align_bars), placed in shared memory once and every worker reads it in place
+    Returns one row per parameter set with its backtest summary, best score first
+    """
+    from tqdm import tqdm
+    panel, _ = align_bars(panel)
+    tasks = group_tasks(indicator, parameter_sets(indicator, grid, samples, seed))
+    rows = []
+    with shared_panel.SharedPanel.from_panel(panel) as shared, \
+            ProcessPoolExecutor(max_workers=max_workers or cpu_count(), initializer=shared_panel.init_worker,
+                                initargs=(shared.handle,)) as executor:
+        futures = [executor.submit(run_task, indicator, combos, fee) for combos in tasks]
+        for future in tqdm(as_completed(futures), total=len(futures), desc=f"Sweeping {indicator.upper()}"):
+            try:
+                rows.extend(future.result())
+            except Exception as e:
+                logging.error(f"Error in {indicator.upper()} sweep task: {str(e)}")
+    table = pd.DataFrame(rows)
+    return table.sort_values(score, ascending=False).reset_index(drop=True) if not table.empty else table
+
+# Main program
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Search the indicator parameters with the best backtest score")
+    parser.add_argument('--indicators', nargs='+', default=list(PARAM_GRID), choices=list(PARAM_GRID))
+    parser.add_argument('--symbols', nargs='+', help="Symbols to backtest on, defaults to the S&P 500")
+    parser.add_argument('--samples', type=int, help="Random search over this many parameter sets instead of the full grid")
+    parser.add_argument('--fee', type=float, default=0.0, help="Fee per entry and exit as a fraction of the position")
+    parser.add_argument('--workers', type=int, help="Number of worker processes, defaults to the number of cores")
+    parser.add_argument('--output', help="Write all results to this CSV file")
+    args = parser.parse_args()
+
+    start_time = time.time()
+    symbols = args.symbols or get_sp500_symbols()
+    panel = build_panel(price_store.load_chunk(symbols))
+    results = []
+    for name in args.indicators:
+        table = sweep(panel, name, samples=args.samples, fee=args.fee, max_workers=args.workers)
+        logging.info(f"Best {name.upper()} parameters:\n{table.head(5).to_string()}")
+        results.append(table)
+    if args.output and results:
+        pd.concat(results).to_csv(args.output, index=False)
+
+    end_time = time.time()
+    logging.info(f"Sweep completed. Execution time: {end_time - start_time:.2f} seconds")
@@ -0,0 +1,180 @@
+import pandas as pd
+import numpy as np
+
+# Numeric signal codes used inside the panel engine
+BUY = 1
+SELL = -1
+
+# Fields of the price panel and the indicators that need them
+FIELDS = ('Adj Close', 'Close', 'High', 'Low', 'Volume')
+
+def build_panel(frames, fields=FIELDS):
+    """
+    Turn a dict of symbol -> DataFrame into a dict of field -> dates x symbols DataFrame
+    """
+    frames = {symbol: data for symbol, data in frames.items() if not data.empty}
+    panel = {}
+    for field in fields:
+        panel[field] = pd.concat({symbol: data[field] for symbol, data in frames.items() if field in data}, axis=1).sort_index()
+    return panel
+
+def align_bars(panel):
+    """
+    Line the bars of every symbol up by their position from its last bar instead of by date
+    A symbol missing dates other symbols have (a halt, a late listing, an older last bar) then has no NaN rows
+    inside its history, so rolling windows, EMAs and the last signal days see the same bars as the per-symbol functions
+    Returns the aligned panel, indexed by bar position with the last bar of every symbol in the last row,
+    and a bars x symbols frame of the date of every bar (NaT before the first bar of a symbol)
+    """
+    fields = list(panel)
+    first = panel[fields[0]]
+    values = {field: panel[field].reindex(index=first.index, columns=first.columns).to_numpy(dtype=np.float64) for field in fields}
+    present = np.zeros(first.shape, dtype=bool)
+    for array in values.values():
+        present |= ~np.isnan(array)
+    depth = int(present.sum(axis=0).max()) if present.size else 0
+    # A stable sort moves the rows without a bar to the top and keeps the bars of every symbol in date order
+    order = np.argsort(present, axis=0, kind='stable')[len(first) - depth:]
+    index = pd.RangeIndex(depth, name='Bar')
+    aligned = {field: pd.DataFrame(np.take_along_axis(array, order, axis=0), index=index, columns=first.columns)
+               for field, array in values.items()}
+    dates = np.take_along_axis(np.broadcast_to(first.index.to_numpy()[:, None], first.shape), order, axis=0)
+    dates = pd.DataFrame(np.where(np.take_along_axis(present, order, axis=0), dates, np.datetime64('NaT')),
+                         index=index, columns=first.columns)
+    return aligned, dates
+
+def panel_rsi(close, period=14):
+    """
+    RSI of every column of a dates x symbols close panel, same values as indicators.get_rsi
+    """
+    delta = close.diff()
+    # The first bar of a symbol counts as no change, rows before its listing stay NaN
+    up = delta.where(delta > 0, 0).where(close.notna())
+    down = -delta.where(delta < 0, 0).where(close.notna())
+    avg_gain = up.rolling(window=period).mean()
+    avg_loss = down.rolling(window=period).mean()
+    rs = avg_gain / avg_loss
+    return 100 - (100 / (1 + rs))
+
+def panel_macd_line(close, short_period=12, long_period=26):
+    """
+    MACD line (short EMA - long EMA) of every column of a close panel
+    """
+    short_ema = close.ewm(span=short_period, adjust=False).mean()
+    long_ema = close.ewm(span=long_period, adjust=False).mean()
+    return short_ema - long_ema
+
+def panel_macd(close, short_period=12, long_period=26, signal_period=9):
+    """
+    MACD and signal line of every column of a close panel, same values as indicators.get_macd
+    """
+    macd = panel_macd_line(close, short_period, long_period)
+    signal = macd.ewm(span=signal_period, adjust=False).mean()
+    return macd, signal
+
+def panel_rsv(high, low, close, n=9):
+    """
+    Raw stochastic value of every column of the price panels
+    """
+    low_min = low.rolling(window=n).min()
+    high_max = high.rolling(window=n).max()
+    return (close - low_min) / (high_max - low_min) * 100
+
+def panel_kdj(high, low, close, n=9, m1=3, m2=3, rsv=None):
+    """
+    K, D and J of every column of the price panels, same values as indicators.get_kdj
+    An already computed RSV panel for the same n can be passed in
+    """
+    rsv = panel_rsv(high, low, close, n) if rsv is None else rsv
+    k = rsv.ewm(span=m1, adjust=False).mean()
+    d = k.ewm(span=m2, adjust=False).mean()
+    j = 3 * k - 2 * d
+    return k, d, j
+
+def panel_vol_ratio(volume, n=20):
+    """
+    Volume to n-day average volume ratio of every column of a volume panel
+    """
+    return volume / volume.rolling(window=n).mean()
+
+def panel_cross_signal(fast, slow, buy_condition=True, sell_condition=True):
+    """
+    BUY where the fast line crosses above the slow line, SELL where it crosses below, 0 elsewhere
+    """
+    cross_above = (fast.shift(1) <= slow.shift(1)) & (fast > slow) & buy_condition
+    cross_below = (fast.shift(1) >= slow.shift(1)) & (fast < slow) & sell_condition
+    return pd.DataFrame(np.select([cross_above, cross_below], [BUY, SELL], 0).astype(np.int8), index=fast.index, columns=fast.columns)
+
+def panel_threshold_signal(values, buy_mask, sell_mask):
+    """
+    BUY where buy_mask holds, SELL where sell_mask holds, 0 elsewhere
+    """
+    return pd.DataFrame(np.select([buy_mask, sell_mask], [BUY, SELL], 0).astype(np.int8), index=values.index, columns=values.columns)
+
+def panel_signals(panel, indicator, **params):
+    """
+    Indicator values and signal codes of every symbol in the panel
+    """
+    if indicator == 'rsi':
+        buy_threshold = params.pop('buy_threshold', 20)
+        sell_threshold = params.pop('sell_threshold', 80)
+        rsi = panel_rsi(panel['Adj Close'], **params)
+        return rsi, panel_threshold_signal(rsi, rsi < buy_threshold, rsi > sell_threshold)
+    elif indicator == 'macd':
+        macd, signal = panel_macd(panel['Adj Close'], **params)
+        return macd, panel_cross_signal(macd, signal)
+    elif indicator == 'kdj':
+        buy_threshold = params.pop('buy_threshold', 20)
+        sell_threshold = params.pop('sell_threshold', 80)
+        k, d, j = panel_kdj(panel['High'], panel['Low'], panel['Close'], **params)
+        return j, panel_cross_signal(k, d, j > buy_threshold, j < sell_threshold)
+    elif indicator == 'vol':
+        buy_threshold = params.pop('buy_threshold', 1.5)
+        sell_threshold = params.pop('sell_threshold', 0.5)
+        vol_ratio = panel_vol_ratio(panel['Volume'], **params)
+        return vol_ratio, panel_threshold_signal(vol_ratio, vol_ratio > buy_threshold, vol_ratio < sell_threshold)
+    raise ValueError(f"Unknown indicator: {indicator}")
+
+def last_values(values, positions):
+    """
+    Value of every symbol at its own last bar
+    """
+    array = values.to_numpy()
+    columns = np.arange(array.shape[1])
+    result = array[np.maximum(positions, 0), columns]
+    return pd.Series(np.where(positions >= 0, result, np.nan), index=values.columns)
+
+def last_signal_codes(signals, positions, days=5, last_bar_only=False):
+    """
+    BUY if any of the last days bars of a symbol fired BUY, otherwise SELL if any fired SELL
+    """
+    array = signals.to_numpy()
+    rows = np.arange(array.shape[0])[:, None]
+    window = 1 if last_bar_only else days
+    in_tail = (rows <= positions) & (rows > positions - window)
+    buy = ((array == BUY) & in_tail).any(axis=0)
+    sell = ((array == SELL) & in_tail).any(axis=0)
+    return pd.Series(np.select([buy, sell], [BUY, SELL], 0), index=signals.columns)
+
+def panel_scan(panel, indicators=('rsi', 'macd', 'kdj', 'vol'), params=None, days=5, min_bars=30):
+    """
+    Evaluate the selected indicators on a whole price panel with column-wise operations
+    Returns the same table as scan.scan: one row per symbol with a signal and last value per indicator
+    The panel is aligned by bar position first (align_bars), so dates missing from some symbols do not matter
+    """
+    params = params or {}
+    panel, dates = align_bars(panel)
+    bars = dates.notna().sum().to_numpy()
+    positions = np.where(bars > 0, len(dates) - 1, -1)
+    enough_bars = bars > min_bars
+    table = pd.DataFrame(index=dates.columns)
+    table.index.name = 'Symbol'
+    table['Date'] = dates.iloc[-1] if len(dates) else pd.NaT
+    for name in indicators:
+        values, signals = panel_signals(panel, name, **params.get(name, {}))
+        # RSI only looks at the last bar, the crossing and volume signals at the last days bars
+        codes = last_signal_codes(signals, positions, days, last_bar_only=(name == 'rsi'))
+        signal = pd.Series(np.select([codes == BUY, codes == SELL], ['Buy', 'Sell'], ''), index=codes.index, dtype=object)
+        table[f"{name.upper()} Signal"] = signal.where(enough_bars)
+        table[f"{name.upper()} Value"] = last_values(values, positions).where(enough_bars)
+    return table.sort_index()
@@ -0,0 +1,253 @@
+import time
+import queue
+import threading
+import logging
+import instrument
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import cpu_count
+from batch_fetch import CHUNK_SIZE, chunked
+
+# Concurrent fetch requests, independent of the number of compute processes
+FETCH_WORKERS = 8
+# Maximum number of fetched symbols waiting for a compute worker
+QUEUE_SIZE = 256
+# Compute time one task should take, enough to hide the pickling and scheduling cost of a task
+TARGET_TASK_SECONDS = 0.2
+# Symbols in the first tasks, before the per-symbol cost has been measured, and at most
+INITIAL_BATCH_SIZE = 4
+MAX_BATCH_SIZE = 256
+# How long the scheduler waits for fetched data before sending a partial batch
+POLL_SECONDS = 0.05
+
+_DONE = object()
+
+def _fetch_stage(symbols, fetch, out_queue, fetch_workers, chunk_size):
+    """
+    Fetch the symbols chunk by chunk in a thread pool and put (symbol, data) pairs on the queue
+    Blocks whenever the queue is full so fetching never runs far ahead of computing
+    """
+    def fetch_one(chunk):
+        try:
+            with instrument.timer('fetch', chunk):
+                frames = fetch(chunk)
+        except Exception as e:
+            logging.error(f"Error fetching chunk starting with {chunk[0]}: {str(e)}")
+            instrument.count('fetch_errors')
+            frames = {}
+        for symbol in chunk:
+            out_queue.put((symbol, frames.get(symbol)))
+
+    try:
+        with ThreadPoolExecutor(max_workers=fetch_workers) as executor:
+            list(executor.map(fetch_one, chunked(symbols, chunk_size)))
+    finally:
+        out_queue.put(_DONE)
+
+class BatchSizer:
+    """
+    Number of symbols per compute task, adapted so one task takes about target_seconds
+    The per-symbol cost is an exponential average of what the workers measured
+    """
+    def __init__(self, target_seconds=TARGET_TASK_SECONDS, max_size=MAX_BATCH_SIZE, initial_size=INITIAL_BATCH_SIZE):
+        self.target_seconds = target_seconds
+        self.max_size = max_size
+        self.size = min(initial_size, max_size)
+        self.symbol_seconds = None
+
+    def update(self, seconds, symbols):
+        if symbols == 0:
+            return
+        cost = seconds / symbols
+        self.symbol_seconds = cost if self.symbol_seconds is None else 0.7 * self.symbol_seconds + 0.3 * cost
+        self.size = int(min(self.max_size, max(1, self.target_seconds / max(self.symbol_seconds, 1e-6))))
+
+def _compute_batch(compute, batch):
+    """
+    Run compute over a batch of (symbol, data) pairs in a worker
+    Returns (symbol, result, seconds, errors logged, exception message) for every symbol
+    """
+    outcomes = []
+    for symbol, data in batch:
+        try:
+            result, seconds, errors = instrument.timed_call(compute, symbol, data)
+            outcomes.append((symbol, result, seconds, errors, None))
+        except Exception as e:
+            outcomes.append((symbol, None, 0.0, 0, str(e)))
+    return outcomes
+
+def run_pipeline(symbols, fetch, compute, fetch_workers=FETCH_WORKERS, compute_workers=None,
+                 queue_size=QUEUE_SIZE, chunk_size=CHUNK_SIZE, desc="Processing stocks",
+                 target_task_seconds=TARGET_TASK_SECONDS, max_batch_size=MAX_BATCH_SIZE, checkpoint=None, executor=None):
+    """
+    Two stage scan: fetch(chunk) -> {symbol: DataFrame} runs in threads, compute(symbol, data)
+    runs in a process pool, connected through a bounded queue
+    Fetched symbols are sent to the pool in batches sized to take about target_task_seconds each,
+    with at most two batches per worker in flight
+    A batch whose worker process died is re-run on a fresh pool on its own, split in halves
+    when it crashes again, until the symbol that kills its worker is found and given up
+    Symbols that could not be fetched are not passed to compute
+    With a checkpoint (checkpoint.open_checkpoint) only its remaining symbols are scanned, every
+    finished batch is stored in it and the results include the ones of earlier, interrupted runs
+    A running executor (e.g. the warm pool of service.py) is used instead of starting a new pool and left
+    running, a replacement for it after a crash is shut down here
+    Stage timings and counters go to the current instrument run, if one is recorded
+    Returns the list of compute results
+    """
+    symbols = checkpoint.remaining() if checkpoint is not None else list(symbols)
+    instrument.count('symbols', len(symbols))
+    compute_workers = compute_workers or cpu_count()
+    max_in_flight = 2 * compute_workers
+    fetched = queue.Queue(maxsize=queue_size)
+    fetcher = threading.Thread(target=_fetch_stage, args=(symbols, fetch, fetched, fetch_workers, chunk_size), daemon=True)
+    fetcher.start()
+
+    sizer = BatchSizer(target_task_seconds, max_batch_size)
+    results = []
+    pending = {}
+    retry = deque()
+    compute_seconds = []
+    pool_start = time.perf_counter()
+    from tqdm import tqdm  # Only the parent shows progress, workers importing this module skip it
+    owned = executor is None
+    if owned:
+        executor = ProcessPoolExecutor(max_workers=compute_workers)
+    progress = tqdm(total=len(symbols), desc=desc)
+
+    def submit(batch, isolated=False):
+        future = executor.submit(_compute_batch, compute, batch)
+        pending[future] = (batch, time.perf_counter(), isolated)
+        instrument.count('tasks')
+
+    def collect(done):
+        nonlocal executor, owned
+        crashed = []
+        for future in done:
+            batch, submitted, isolated = pending.pop(future)
+            try:
+                outcomes = future.result()
+            except BrokenProcessPool:
+                crashed.append((batch, isolated))
+                continue
+            except Exception as e:
+                logging.error(f"Error computing signals for {len(batch)} symbols starting with {batch[0][0]}: {str(e)}")
+                instrument.count('compute_exceptions', len(batch))
+                progress.update(len(batch))
+                continue
+            stats = instrument.current()
+            batch_seconds = 0.0
+            completed = []
+            for symbol, result, seconds, errors, error in outcomes:
+                if error is not None:
+                    logging.error(f"Error computing signal for {symbol}: {error}")
+                    instrument.count('compute_exceptions')
+                    continue
+                results.append(result)
+                completed.append((symbol, result))
+                batch_seconds += seconds
+                if stats is not None:
+                    stats.add_time('compute', seconds, [symbol])
+                    stats.count('computed')
+                    stats.count('compute_errors', errors)
+            if checkpoint is not None:
+                checkpoint.record(completed)
+            compute_seconds.append(batch_seconds)
+            sizer.update(batch_seconds, len(batch))
+            if stats is not None:
+                stats.observe('task_latency', time.perf_counter() - submitted)
+            progress.update(len(batch))
+        if crashed:
+            # Every task still running on the broken pool failed with it, re-run them one at a time
+            for future in list(pending):
+                batch, _, isolated = pending.pop(future)
+                crashed.append((batch, isolated))
+            executor.shutdown(wait=True)
+            executor = ProcessPoolExecutor(max_workers=compute_workers)
+            owned = True
+            instrument.count('pool_restarts')
+            for batch, isolated in crashed:
+                if not isolated:
+                    retry.append(batch)
+                elif len(batch) > 1:
+                    retry.extend([batch[:len(batch) // 2], batch[len(batch) // 2:]])
+                else:
+                    logging.error(f"Worker process died computing {batch[0][0]}, skipping it")
+                    instrument.count('worker_crashes')
+                    progress.update(1)
+
+    def collect_first():
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        collect(done)
+
+    batch = []
+    fetch_done = False
+    try:
+        while True:
+            if retry:
+                # Batches of a crashed pool run alone, so a second crash points at the batch that caused it
+                if pending:
+                    collect_first()
+                else:
+                    submit(retry.popleft(), isolated=True)
+                continue
+            if len(pending) >= max_in_flight:
+                collect_first()
+                continue
+            if fetch_done:
+                if batch:
+                    submit(batch)
+                    batch = []
+                elif pending:
+                    collect_first()
+                else:
+                    break
+                continue
+            try:
+                # Block only when there is nothing else to do, otherwise poll so finished tasks get collected
+                with instrument.timer('fetch_wait'):
+                    item = fetched.get(timeout=None if not (batch or pending) else POLL_SECONDS)
+            except queue.Empty:
+                if batch:
+                    # Do not leave workers idle waiting for a full batch
+                    submit(batch)
+                    batch = []
+                else:
+                    collect(wait(pending, timeout=0).done)
+                continue
+            if item is _DONE:
+                fetch_done = True
+                continue
+            symbol, data = item
+            if data is None or data.empty:
+                instrument.count('empty_frames')
+                progress.update(1)
+                continue
+            batch.append((symbol, data))
+            if len(batch) >= sizer.size:
+                submit(batch)
+                batch = []
+    finally:
+        if owned:
+            executor.shutdown(wait=True)
+        progress.close()
+        if checkpoint is not None:
+            checkpoint.close()
+    # Worker capacity not spent computing: process start-up, pickling, scheduling and starvation
+    stats = instrument.current()
+    if stats is not None:
+        stats.add_time('pool', max((time.perf_counter() - pool_start) * compute_workers - sum(compute_seconds), 0.0))
+    fetcher.join()
+    if checkpoint is not None:
+        checkpoint.finish()
+        return list(checkpoint.results.values())
+    return results
+
+def scan_signals(symbols, fetch, compute, **kwargs):
+    """
+    Run the pipeline with a compute function returning (symbol, signal) and split the Buy/Sell symbols
+    """
+    results = run_pipeline(symbols, fetch, compute, **kwargs)
+    buyable_stocks = [symbol for symbol, signal in results if signal == 'Buy']
+    sellable_stocks = [symbol for symbol, signal in results if signal == 'Sell']
+    return buyable_stocks, sellable_stocks
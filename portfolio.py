@@ -0,0 +1,158 @@
+import os
+import json
+import time
+import logging
+import argparse
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+import price_store
+import instrument
+import streaming
+from batch_fetch import chunked
+from indicators import min_history
+from pipeline import FETCH_WORKERS
+
+# Cached indicator states of the held symbols, so a daily run only feeds them the newest bars
+STATE_FILE = "portfolio_state.json"
+INDICATORS = tuple(streaming.STATES)
+
+def load_holdings(path):
+    """
+    Held symbols from a CSV file with a Symbol column (other columns such as shares are ignored)
+    or a text file with one symbol per line, lines starting with # are comments
+    """
+    if path.endswith('.csv'):
+        holdings = pd.read_csv(path)
+        column = next(column for column in holdings.columns if column.lower() in ('symbol', 'ticker'))
+        symbols = holdings[column].dropna().astype(str)
+    else:
+        with open(path) as f:
+            symbols = [line.split('#')[0].strip() for line in f]
+    return list(dict.fromkeys(symbol.strip().upper() for symbol in symbols if symbol.strip()))
+
+def load_cache(path, params):
+    """
+    Cached states and their last bar date per symbol, empty when missing or built with other parameters
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        cache = json.load(f)
+    if cache.get('params') != params:
+        logging.info(f"Indicator parameters changed, rebuilding the states in {path}")
+        return {}
+    return cache['symbols']
+
+def save_cache(path, params, entries):
+    with open(path + ".tmp", 'w') as f:
+        json.dump({'params': params, 'symbols': entries}, f)
+    os.replace(path + ".tmp", path)
+
+def warmup_bars(indicators=INDICATORS, params=None):
+    """
+    Bars a new state is warmed up on, enough for converged values on the newest bar
+    """
+    params = params or {}
+    return max(min_history(name, days=1, **params.get(name, {})) for name in indicators)
+
+def bar_prices(bar):
+    """
+    Close and Adj Close of a bar, stored with the cached states to notice a rescaled history
+    """
+    return [float(bar[column]) for column in ('Close', 'Adj Close') if column in bar]
+
+def cache_matches(data, entry):
+    """
+    Whether the stored history still contains the cached bar at the prices the states were built on
+    A split or dividend rescales the whole history, the states then have to be warmed up again
+    """
+    date = pd.Timestamp(entry['date'])
+    if date not in data.index or 'prices' not in entry:
+        return False
+    prices = bar_prices(data.loc[date])
+    return len(prices) == len(entry['prices']) and np.allclose(prices, entry['prices'], rtol=price_store.ADJUSTMENT_TOLERANCE,
+                                                               atol=0, equal_nan=True)
+
+def evaluate_holding(data, entry=None, indicators=INDICATORS, params=None):
+    """
+    Bring the cached states of one symbol ({'date', 'prices', 'states'}) up to its newest bar
+    Returns the new cache entry and {indicator: (value, signal)} of the newest bar
+    The entry stops one bar short of the newest one, which may still be partial and is fetched again on the next run
+    """
+    new = pd.DataFrame()
+    if entry is not None:
+        new = data[data.index > pd.Timestamp(entry['date'])]
+    if entry is None or new.empty or not cache_matches(data, entry):
+        # No usable cache: the symbol is new, or its stored history no longer contains the cached bar or was rescaled
+        states = streaming.new_states(indicators, params)
+        new = data.tail(warmup_bars(indicators, params) + 1)
+        entry = None
+    else:
+        states = streaming.states_from_dict(entry['states'])
+    streaming.warm_up(states, new.iloc[:-1])
+    if len(new) > 1:
+        entry = {'date': f"{new.index[-2]:%Y-%m-%d}", 'prices': bar_prices(new.iloc[-2]),
+                 'states': streaming.states_to_dict(states)}
+    return entry, streaming.update_states(states, new.iloc[-1])
+
+def monitor(symbols, fetch=price_store.refresh_chunk, indicators=INDICATORS, params=None, state_file=STATE_FILE, rebuild=False):
+    """
+    Evaluate held symbols on their newest bar with cached indicator states
+    Only the bars after the cached date are fed to the states, so a daily run costs a few bars per symbol
+    Returns a table indexed by symbol with the value and signal of every indicator and the indicators that say Sell
+    """
+    params = {name: params.get(name, {}) for name in indicators} if params else {name: {} for name in indicators}
+    cache = {} if rebuild else load_cache(state_file, params)
+    with ThreadPoolExecutor(FETCH_WORKERS) as executor:
+        frames = {}
+        for chunk in executor.map(fetch, chunked(symbols)):
+            frames.update(chunk)
+
+    rows = {}
+    entries = {}
+    for symbol in symbols:
+        data = frames.get(symbol)
+        if data is None or data.empty:
+            logging.warning(f"No data for held symbol {symbol}")
+            instrument.count('missing_symbols')
+            continue
+        with instrument.timer('compute', [symbol]):
+            entry, output = evaluate_holding(data, cache.get(symbol), indicators, params)
+        if entry is not None:
+            entries[symbol] = entry
+        row = {'Date': data.index[-1]}
+        for name, (value, signal) in output.items():
+            row[f"{name.upper()} Value"] = value
+            row[f"{name.upper()} Signal"] = signal
+        row['Sell Alerts'] = ", ".join(name.upper() for name, (_, signal) in output.items() if signal == 'Sell')
+        rows[symbol] = row
+    # Symbols no longer held drop out of the cache
+    save_cache(state_file, params, entries)
+    table = pd.DataFrame.from_dict(rows, orient='index')
+    table.index.name = 'Symbol'
+    return table
+
+# Main program
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Check held stocks for RSI, MACD, KDJ and volume sell alerts")
+    parser.add_argument('holdings', help="CSV file with a Symbol column or a text file with one symbol per line")
+    parser.add_argument('--indicators', nargs='+', default=list(INDICATORS), choices=list(INDICATORS))
+    parser.add_argument('--offline', action='store_true', help="Only read the local price store")
+    parser.add_argument('--state', default=STATE_FILE, help="File the indicator states are cached in")
+    parser.add_argument('--rebuild', action='store_true', help="Ignore the cached states and warm them up again")
+    parser.add_argument('--output', help="Write the result table to this CSV file")
+    args = parser.parse_args()
+
+    start_time = time.time()
+    symbols = load_holdings(args.holdings)
+    fetch = price_store.load_chunk if args.offline else price_store.refresh_chunk
+    with instrument.record_run("portfolio") as stats:
+        table = monitor(symbols, fetch, args.indicators, state_file=args.state, rebuild=args.rebuild)
+    for symbol, row in table[table['Sell Alerts'] != ''].iterrows():
+        logging.info(f"SELL {symbol} ({row['Date']:%Y-%m-%d}): {row['Sell Alerts']}")
+    if args.output:
+        table.to_csv(args.output)
+    logging.info(f"Checked {len(table)} of {len(symbols)} holdings in {time.time() - start_time:.2f} seconds")
+    logging.info(stats.summary())
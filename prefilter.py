@@ -0,0 +1,176 @@
+import os
+import re
+import logging
+import argparse
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+import price_store
+import instrument
+from universe import get_universe, SNAPSHOT_DIR
+
+# Last price and average dollar volume per symbol, derived from the price store and refreshed when a store file changes
+STATS_FILE = os.path.join(SNAPSHOT_DIR, "price_stats.parquet")
+# Bars the average dollar volume is taken over
+STATS_DAYS = 20
+# Default rules: common stock (including ADRs) trading at 1 USD or more with 1M USD average daily dollar volume
+SECURITY_TYPES = ('common',)
+MIN_PRICE = 1.0
+MIN_DOLLAR_VOLUME = 1e6
+
+# Security types recognised from the listing name, the first match wins and anything else is common stock
+TYPE_PATTERNS = [
+    ('warrant', re.compile(r'\bwarrants?\b', re.I)),
+    ('right', re.compile(r'\brights?\b', re.I)),
+    ('unit', re.compile(r'[-,]\s*units?\b|\bunits?\s*(?:,|each|consisting)|\bunits?\s*$', re.I)),
+    # Issue descriptors only, a company name like Preferred Bank is common stock
+    ('preferred', re.compile(r'\bpreferred (?:stock|shares?|securities)\b|\bseries [a-z0-9-]+ (?:\w+ )*?preferred\b'
+                             r'|\bpfd\b|\bcumulative redeemable\b', re.I)),
+    ('debt', re.compile(r'\bnotes?\b|\bdebentures?\b|\bbonds?\b|\bbaby bonds?\b', re.I)),
+]
+# CQS suffixes in the symbol itself, e.g. ABR$D for a preferred series
+SYMBOL_PATTERNS = [
+    ('preferred', re.compile(r'\$|\.PR', re.I)),
+    ('warrant', re.compile(r'\.WS?$|\+$', re.I)),
+    ('unit', re.compile(r'\.U$|=$', re.I)),
+    ('right', re.compile(r'\.R$|\^$', re.I)),
+]
+
+# Listings the patterns have got wrong before, checked by check_patterns
+KNOWN_TYPES = [
+    ('PFBC', "Preferred Bank - Common Stock", 'common'),
+    ('APTS', "Preferred Apartment Communities, Inc. - Common Stock", 'common'),
+    ('UNTC', "Unit Corporation - Common Stock", 'common'),
+    ('BABA', "Alibaba Group Holding Limited American Depositary Shares each representing eight Ordinary share", 'common'),
+    ('AGNCN', "AGNC Investment Corp. - Depositary Shares Each Representing a 1/1,000th Interest in a Share of "
+              "7.00% Series C Fixed-To-Floating Rate Cumulative Redeemable Preferred Stock", 'preferred'),
+    ('FITBI', "Fifth Third Bancorp - Depositary Shares each representing 1/1000th ownership interest in a share of "
+              "6.625% Fixed-to-Floating Rate Non-Cumulative Perpetual Preferred Stock, Series I", 'preferred'),
+    ('ABR$D', "Arbor Realty Trust 6.375% Series D Cumulative Redeemable Preferred Stock", 'preferred'),
+    ('GAINL', "Gladstone Investment Corporation - 6.375% Series E Cumulative Term Preferred Stock due 2025", 'preferred'),
+    ('CCCXW', "Churchill Capital Corp X - Warrants, each whole warrant exercisable for one Class A ordinary share", 'warrant'),
+    ('ACAHU', "Acri Capital Acquisition Corp - Units, each consisting of one share of Class A common stock", 'unit'),
+]
+
+def security_type(name, symbol=''):
+    """
+    Security type of one listing: 'common', 'warrant', 'right', 'unit', 'preferred' or 'debt'
+    """
+    for kind, pattern in SYMBOL_PATTERNS:
+        if pattern.search(symbol):
+            return kind
+    for kind, pattern in TYPE_PATTERNS:
+        if pattern.search(name):
+            return kind
+    return 'common'
+
+def check_patterns(examples=KNOWN_TYPES):
+    """
+    Classify every (symbol, name, expected type) example, raises ValueError listing the wrong ones
+    """
+    wrong = [(symbol, kind, security_type(name, symbol)) for symbol, name, kind in examples if security_type(name, symbol) != kind]
+    if wrong:
+        raise ValueError(f"Misclassified listings (symbol, expected, got): {wrong}")
+
+def classify(table):
+    """
+    Security type of every row of a NASDAQ Traded List table
+    """
+    names = table['Security Name'].fillna('') if 'Security Name' in table else pd.Series('', index=table.index)
+    return pd.Series([security_type(name, symbol) for name, symbol in zip(names, table['Symbol'].astype(str))], index=table.index)
+
+def _symbol_stats(symbol, days, store_dir):
+    path = price_store.store_path(symbol, store_dir)
+    try:
+        data = pd.read_parquet(path, columns=['Close', 'Volume']).tail(days)
+    except Exception as e:
+        logging.error(f"Error reading stored data for {symbol}: {e}")
+        return None
+    if data.empty:
+        return None
+    return {'Symbol': symbol, 'mtime': os.path.getmtime(path), 'Date': data.index[-1],
+            'Close': float(data['Close'].iloc[-1]), 'Dollar Volume': float((data['Close'] * data['Volume']).mean())}
+
+def update_stats(symbols, stats_file=STATS_FILE, store_dir=price_store.STORE_DIR, days=STATS_DAYS):
+    """
+    Last close and average dollar volume of the stored symbols, indexed by symbol
+    Only the store files that changed since the stats were last taken are read, and only their Close and Volume columns
+    """
+    stats = pd.read_parquet(stats_file) if os.path.exists(stats_file) else pd.DataFrame(columns=['mtime'])
+    stale = []
+    for symbol in symbols:
+        path = price_store.store_path(symbol, store_dir)
+        if os.path.exists(path) and (symbol not in stats.index or stats.at[symbol, 'mtime'] != os.path.getmtime(path)):
+            stale.append(symbol)
+    if stale:
+        with ThreadPoolExecutor(8) as executor:
+            rows = [row for row in executor.map(lambda symbol: _symbol_stats(symbol, days, store_dir), stale) if row]
+        if rows:
+            fresh = pd.DataFrame(rows).set_index('Symbol')
+            stats = pd.concat([stats[~stats.index.isin(fresh.index)], fresh]) if not stats.empty else fresh
+            os.makedirs(os.path.dirname(stats_file) or '.', exist_ok=True)
+            stats.to_parquet(stats_file + ".tmp")
+            os.replace(stats_file + ".tmp", stats_file)
+        logging.info(f"Updated the price stats of {len(rows)} symbols")
+    return stats
+
+def prefilter(table, stats=None, security_types=SECURITY_TYPES, exchanges=None, market_categories=None,
+              min_price=MIN_PRICE, min_dollar_volume=MIN_DOLLAR_VOLUME):
+    """
+    Rows of a universe table that pass every rule, each rule is skipped when its argument is None
+      security_types:   allowed security types (see security_type)
+      exchanges:         allowed Listing Exchange codes, e.g. ('Q', 'N', 'A')
+      market_categories: allowed NASDAQ Market Category codes, e.g. ('Q', 'G')
+      min_price:         minimum last close
+      min_dollar_volume: minimum average daily close x volume over the last STATS_DAYS bars
+    Price and volume need stats (update_stats), a symbol without stats passes them, it is judged once its bars are stored
+    """
+    keep = pd.Series(True, index=table.index)
+    rules = []
+    if security_types is not None:
+        rules.append(('security_type', classify(table).isin(security_types)))
+    if exchanges is not None and 'Listing Exchange' in table:
+        rules.append(('exchange', table['Listing Exchange'].isin(exchanges)))
+    if market_categories is not None and 'Market Category' in table:
+        rules.append(('market_category', table['Market Category'].isin(market_categories)))
+    if stats is not None and not stats.empty:
+        matched = stats.reindex(table['Symbol'])
+        if min_price is not None:
+            rules.append(('min_price', pd.Series(~(matched['Close'] < min_price).to_numpy(), index=table.index)))
+        if min_dollar_volume is not None:
+            rules.append(('min_dollar_volume', pd.Series(~(matched['Dollar Volume'] < min_dollar_volume).to_numpy(), index=table.index)))
+    for name, passed in rules:
+        dropped = int((keep & ~passed).sum())
+        keep &= passed
+        instrument.count(f"prefilter_{name}", dropped)
+        logging.info(f"Prefilter {name}: dropped {dropped} symbols")
+    logging.info(f"Prefilter kept {int(keep.sum())} of {len(table)} symbols")
+    return table[keep]
+
+def eligible_symbols(universe='nasdaq', stats_file=STATS_FILE, store_dir=price_store.STORE_DIR, snapshot_dir=SNAPSHOT_DIR, **rules):
+    """
+    Symbols of a universe snapshot that pass the prefilter, before any bar is downloaded
+    Keyword arguments are the rules of prefilter, defaults drop everything but common stock priced from 1 USD
+    with 1M USD average daily dollar volume
+    """
+    table = get_universe(universe, snapshot_dir=snapshot_dir)
+    stats = update_stats(table['Symbol'], stats_file, store_dir)
+    return tuple(prefilter(table, stats, **rules)['Symbol'])
+
+# Main program
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Show which listed symbols the prefilter keeps and why the others are dropped")
+    parser.add_argument('--types', nargs='+', default=list(SECURITY_TYPES), help="Security types to keep")
+    parser.add_argument('--min-price', type=float, default=MIN_PRICE)
+    parser.add_argument('--min-dollar-volume', type=float, default=MIN_DOLLAR_VOLUME)
+    parser.add_argument('--output', help="Write the kept symbols to this file, one per line")
+    parser.add_argument('--check', action='store_true', help="Only check the security type patterns on KNOWN_TYPES")
+    args = parser.parse_args()
+    if args.check:
+        check_patterns()
+        logging.info(f"All {len(KNOWN_TYPES)} known listings classified correctly")
+        raise SystemExit
+    symbols = eligible_symbols(security_types=args.types, min_price=args.min_price, min_dollar_volume=args.min_dollar_volume)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write("\n".join(symbols) + "\n")
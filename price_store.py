@@ -0,0 +1,185 @@
+import pandas as pd
+import numpy as np
+import os
+import logging
+import instrument
+from batch_fetch import CHUNK_SIZE, chunked
+from providers import get_provider
+
+# Default location of the on-disk price store (one Parquet file per symbol)
+STORE_DIR = "price_store"
+# Bars per Parquet row group, so the newest bars of a long history are read without reading all of it
+ROW_GROUP_BARS = 1024
+# Relative change of a stored close beyond which the provider is taken to have rescaled the history (split or dividend)
+ADJUSTMENT_TOLERANCE = 1e-4
+
+def store_path(symbol, store_dir=STORE_DIR):
+    """
+    Path of the Parquet file holding the bars of one symbol
+    """
+    return os.path.join(store_dir, f"{symbol.replace('/', '_')}.parquet")
+
+def _normalize(data):
+    """
+    Flatten the (Price, Ticker) columns newer yfinance versions return for a single symbol
+    """
+    if isinstance(data.columns, pd.MultiIndex):
+        data = data.copy()
+        data.columns = data.columns.get_level_values(0)
+    data.index = pd.to_datetime(data.index).tz_localize(None)
+    data.index.name = 'Date'
+    return data
+
+def stored_symbols(store_dir=STORE_DIR):
+    """
+    Symbols that have data in the store
+    """
+    if not os.path.isdir(store_dir):
+        return []
+    return sorted(name[:-len('.parquet')] for name in os.listdir(store_dir) if name.endswith('.parquet'))
+
+def load_prices(symbol, store_dir=STORE_DIR):
+    """
+    Read the stored bars of a symbol, empty DataFrame if the symbol is not stored yet
+    """
+    path = store_path(symbol, store_dir)
+    if not os.path.exists(path):
+        return pd.DataFrame()
+    try:
+        return pd.read_parquet(path)
+    except Exception as e:
+        logging.error(f"Error reading stored data for {symbol}: {e}")
+        return pd.DataFrame()
+
+def load_tail(symbol, bars=None, columns=None, store_dir=STORE_DIR):
+    """
+    Newest bars of a symbol (all of them when bars is None), reading only the row groups that hold them
+    and only the given columns, empty DataFrame if the symbol is not stored yet
+    """
+    import pyarrow.parquet as pq
+    path = store_path(symbol, store_dir)
+    if not os.path.exists(path):
+        return pd.DataFrame()
+    try:
+        file = pq.ParquetFile(path)
+        groups = list(range(file.num_row_groups))
+        if bars is not None and groups:
+            rows = 0
+            for start in reversed(groups):
+                rows += file.metadata.row_group(start).num_rows
+                if rows >= bars:
+                    break
+            groups = groups[start:]
+        data = file.read_row_groups(groups, columns=columns, use_pandas_metadata=True).to_pandas()
+    except Exception as e:
+        logging.error(f"Error reading stored data for {symbol}: {e}")
+        return pd.DataFrame()
+    return data if bars is None else data.tail(bars)
+
+def save_prices(symbol, data, store_dir=STORE_DIR):
+    """
+    Write the full bar history of a symbol to the store
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    path = store_path(symbol, store_dir)
+    tmp_path = path + ".tmp"
+    data.to_parquet(tmp_path, row_group_size=ROW_GROUP_BARS)
+    os.replace(tmp_path, path)  # Never leave a half-written file behind
+
+def merge_bars(stored, new):
+    """
+    Append newly fetched bars to the stored history, newer bars win on overlapping dates
+    """
+    if stored.empty:
+        return new.sort_index()
+    if new.empty:
+        return stored
+    merged = pd.concat([stored, new])
+    merged = merged[~merged.index.duplicated(keep='last')]
+    return merged.sort_index()
+
+def history_changed(stored, new, rtol=ADJUSTMENT_TOLERANCE):
+    """
+    Whether bars fetched again for stored dates differ from the stored ones in Close or Adj Close, as after a split or
+    dividend when the provider rescales the whole history. The last stored bar is not compared, it may have been partial
+    """
+    overlap = new.index.intersection(stored.index[:-1])
+    for column in ('Close', 'Adj Close'):
+        if column in stored and column in new and len(overlap):
+            if not np.allclose(stored.loc[overlap, column], new.loc[overlap, column], rtol=rtol, atol=0, equal_nan=True):
+                return True
+    return False
+
+def refresh_chunk(symbols, store_dir=STORE_DIR, provider=None):
+    """
+    Bring the stored history of a chunk of symbols up to date and return a dict of symbol -> DataFrame
+    Symbols are grouped by their last stored dates so each group is fetched from the same start
+    A symbol whose refetched bars no longer match the stored ones (split or dividend) is downloaded again in full
+    """
+    provider = provider or get_provider()
+    with instrument.timer('fetch.store_read', symbols):
+        stored = {symbol: load_prices(symbol, store_dir) for symbol in symbols}
+    groups = {}
+    for symbol, data in stored.items():
+        # Re-fetch the last stored day as well, its bar may have been partial, and the day before it
+        # to check the stored history against the provider's current adjustment
+        start = data.index[-min(2, len(data))].strftime("%Y-%m-%d") if not data.empty else None
+        groups.setdefault(start, []).append(symbol)
+
+    for start, group in groups.items():
+        try:
+            with instrument.timer('fetch.download', group):
+                frames = provider.fetch(group, start=start)
+        except Exception as e:
+            logging.error(f"Error fetching data for {len(group)} symbols: {str(e)}")
+            instrument.count('fetch_errors')
+            continue
+        rescaled = []
+        for symbol, new in frames.items():
+            with instrument.timer('fetch.parse', [symbol]):
+                new = _normalize(new)
+                if history_changed(stored[symbol], new):
+                    rescaled.append(symbol)
+                    continue
+                stored[symbol] = merge_bars(stored[symbol], new)
+            with instrument.timer('fetch.store_write', [symbol]):
+                save_prices(symbol, stored[symbol], store_dir)
+        if rescaled:
+            logging.info(f"Stored history of {len(rescaled)} symbols was adjusted since the last refresh, downloading it again: {rescaled}")
+            instrument.count('history_refetched', len(rescaled))
+            try:
+                with instrument.timer('fetch.download', rescaled):
+                    frames = provider.fetch(rescaled, start=None)
+            except Exception as e:
+                logging.error(f"Error fetching data for {len(rescaled)} symbols: {str(e)}")
+                instrument.count('fetch_errors')
+                continue
+            for symbol, new in frames.items():
+                stored[symbol] = _normalize(new).sort_index()
+                with instrument.timer('fetch.store_write', [symbol]):
+                    save_prices(symbol, stored[symbol], store_dir)
+    return {symbol: data for symbol, data in stored.items() if not data.empty}
+
+def load_chunk(symbols, store_dir=STORE_DIR):
+    """
+    Read a chunk of symbols from the store without any network access
+    """
+    with instrument.timer('fetch.store_read', symbols):
+        frames = {symbol: load_prices(symbol, store_dir) for symbol in symbols}
+    return {symbol: data for symbol, data in frames.items() if not data.empty}
+
+def refresh_store(symbols, store_dir=STORE_DIR, chunk_size=CHUNK_SIZE, provider=None):
+    """
+    Bring the stored history of every symbol up to date with batched downloads
+    """
+    refreshed = 0
+    for chunk in chunked(symbols, chunk_size):
+        refreshed += len(refresh_chunk(chunk, store_dir, provider))
+    logging.info(f"Refreshed {refreshed} of {len(symbols)} symbols in {store_dir}")
+
+# Main program
+if __name__ == "__main__":
+    import sys
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    symbols = sys.argv[1:]
+    refresh_store(symbols)
@@ -0,0 +1,119 @@
+import pandas as pd
+import numpy as np
+import os
+import zlib
+import logging
+
+class DataProvider:
+    """
+    Source of daily OHLCV bars
+    fetch returns a dict of symbol -> DataFrame with Open, High, Low, Close, Adj Close and Volume columns,
+    start ('YYYY-MM-DD') limits the bars to that date and later, None means the full history
+    """
+    def fetch(self, symbols, start=None):
+        raise NotImplementedError
+
+class YahooProvider(DataProvider):
+    """
+    Batched downloads from Yahoo Finance
+    """
+    def __init__(self, chunk_size=None):
+        self.chunk_size = chunk_size
+
+    def fetch(self, symbols, start=None):
+        from batch_fetch import fetch_symbols, CHUNK_SIZE
+        return fetch_symbols(symbols, start=start, chunk_size=self.chunk_size or CHUNK_SIZE)
+
+class HttpProvider(DataProvider):
+    """
+    Chart API requests through the rate limited client shared by every fetch thread of the process
+    Throttled symbols are retried with backoff instead of dropping out of the scan
+    """
+    def __init__(self, base_url=None, rate=None):
+        from http_client import YAHOO_CHART_URL, RATE
+        self.base_url = base_url or YAHOO_CHART_URL
+        self.rate = rate or RATE
+
+    def fetch(self, symbols, start=None):
+        from http_client import get_client
+        return get_client(base_url=self.base_url, rate=self.rate).fetch(symbols, start=start)
+
+class LocalProvider(DataProvider):
+    """
+    Directory holding one <symbol>.parquet or <symbol>.csv file per symbol, e.g. an exported price store
+    """
+    def __init__(self, directory):
+        self.directory = directory
+
+    def load(self, symbol):
+        name = symbol.replace('/', '_')
+        parquet_path = os.path.join(self.directory, f"{name}.parquet")
+        csv_path = os.path.join(self.directory, f"{name}.csv")
+        try:
+            if os.path.exists(parquet_path):
+                return pd.read_parquet(parquet_path)
+            if os.path.exists(csv_path):
+                return pd.read_csv(csv_path, index_col=0, parse_dates=True)
+        except Exception as e:
+            logging.error(f"Error reading local data for {symbol}: {e}")
+        return pd.DataFrame()
+
+    def fetch(self, symbols, start=None):
+        frames = {}
+        for symbol in symbols:
+            data = self.load(symbol)
+            if start is not None and not data.empty:
+                data = data[data.index >= pd.Timestamp(start)]
+            if not data.empty:
+                frames[symbol] = data
+        return frames
+
+class SyntheticProvider(DataProvider):
+    """
+    Seeded random-walk OHLCV bars, the same seed and symbol always give the same bars
+    """
+    def __init__(self, seed=0, bars=2500, end="2024-08-23"):
+        self.seed = seed
+        self.bars = bars
+        self.end = end
+        self.index = pd.bdate_range(end=end, periods=bars, name='Date')
+
+    def generate(self, symbol):
+        rng = np.random.default_rng([self.seed, zlib.crc32(symbol.encode())])
+        returns = rng.normal(0.0003, 0.02, self.bars)
+        close = rng.uniform(5, 200) * np.exp(np.cumsum(returns))
+        open_ = np.concatenate([[close[0]], close[:-1]]) * np.exp(rng.normal(0, 0.005, self.bars))
+        high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.01, self.bars)))
+        low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.01, self.bars)))
+        volume = rng.lognormal(np.log(rng.uniform(1e4, 1e7)), 0.5, self.bars).round()
+        return pd.DataFrame({'Open': open_, 'High': high, 'Low': low, 'Close': close, 'Adj Close': close, 'Volume': volume}, index=self.index)
+
+    def fetch(self, symbols, start=None):
+        frames = {}
+        for symbol in symbols:
+            data = self.generate(symbol)
+            if start is not None:
+                data = data[data.index >= pd.Timestamp(start)]
+            frames[symbol] = data
+        return frames
+
+def synthetic_symbols(count):
+    """
+    Symbol names for a synthetic universe of the given size
+    """
+    return tuple(f"SYN{i:05d}" for i in range(count))
+
+PROVIDERS = {
+    'yahoo': YahooProvider,
+    'http': HttpProvider,
+    'local': LocalProvider,
+    'synthetic': SyntheticProvider,
+}
+
+def get_provider(name='yahoo', **kwargs):
+    """
+    Create a data provider by name, keyword arguments go to its constructor
+    """
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown data provider: {name}")
+    return PROVIDERS[name](**kwargs)
@@ -0,0 +1,374 @@
+import pandas as pd
+import numpy as np
+import os
+import time
+import shutil
+import tempfile
+import logging
+import argparse
+import inspect
+import functools
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import cpu_count
+import price_store
+import pipeline
+import instrument
+import shared_panel
+import signal_store
+import indicator_cache
+from checkpoint import open_checkpoint
+from indicator_cache import cached
+from indicators import set_engine, get_engine, ENGINES, get_rsi, get_macd, get_kdj, get_vol_ratio, get_cross_signal, min_history, SIGNAL_DAYS
+from universe import get_all_listed_us_stocks
+from prefilter import eligible_symbols, SECURITY_TYPES, MIN_PRICE, MIN_DOLLAR_VOLUME
+from panel import build_panel, panel_scan, FIELDS
+from batch_fetch import chunked
+from providers import get_provider, synthetic_symbols, PROVIDERS
+
+# Symbols with this many bars or fewer are skipped
+MIN_BARS = 30
+# Number of symbols evaluated together by the vectorized panel engine
+PANEL_CHUNK_SIZE = 1000
+# Memory budget of the chunked engine in MB, and the bytes one symbol x date cell of a panel takes while its chunk is
+# evaluated: the bars read, the panel fields, their bar-aligned copy and the intermediate frames of the indicators
+MEMORY_MB = 512
+BYTES_PER_BAR = 384
+# Result tables of the chunked engine are spilled to a temporary directory under this one until they are merged
+SPILL_DIR = "spill"
+
+def last_signal(signal, days=SIGNAL_DAYS):
+    """
+    Buy if any of the last days fired Buy, otherwise Sell if any fired Sell
+    """
+    last_signals = signal.tail(days)
+    if 'Buy' in last_signals.values:
+        return 'Buy'
+    elif 'Sell' in last_signals.values:
+        return 'Sell'
+    return ''
+
+@cached('rsi_signal', ['Adj Close'], context=get_engine)
+def evaluate_rsi(data, period=14, buy_threshold=20, sell_threshold=80):
+    """
+    Signal and last value of the RSI indicator
+    """
+    last_rsi = get_rsi(data, period).iloc[-1]
+    if last_rsi < buy_threshold:
+        return 'Buy', last_rsi
+    elif last_rsi > sell_threshold:
+        return 'Sell', last_rsi
+    return '', last_rsi
+
+@cached('macd_signal', ['Adj Close'], context=get_engine)
+def evaluate_macd(data, short_period=12, long_period=26, signal_period=9):
+    """
+    Signal and last value of the MACD indicator
+    """
+    macd_data = get_macd(data, short_period, long_period, signal_period)
+    signal = get_cross_signal(macd_data['MACD'], macd_data['Signal'])
+    return last_signal(signal), macd_data['MACD'].iloc[-1]
+
+@cached('kdj_signal', ['High', 'Low', 'Close'], context=get_engine)
+def evaluate_kdj(data, n=9, m1=3, m2=3, buy_threshold=20, sell_threshold=80):
+    """
+    Signal and last J value of the KDJ indicator
+    """
+    kdj_data = get_kdj(data, n, m1, m2)
+    signal = get_cross_signal(kdj_data['K'], kdj_data['D'], kdj_data['J'] > buy_threshold, kdj_data['J'] < sell_threshold)
+    return last_signal(signal), kdj_data['J'].iloc[-1]
+
+@cached('vol_signal', ['Volume'], context=get_engine)
+def evaluate_vol(data, n=20, buy_threshold=1.5, sell_threshold=0.5):
+    """
+    Signal and last value of the volume ratio
+    """
+    vol_ratio = get_vol_ratio(data, n)
+    signal = pd.Series(np.select([vol_ratio > buy_threshold, vol_ratio < sell_threshold], ['Buy', 'Sell'], ''), index=vol_ratio.index)
+    return last_signal(signal), vol_ratio.iloc[-1]
+
+INDICATORS = {
+    'rsi': evaluate_rsi,
+    'macd': evaluate_macd,
+    'kdj': evaluate_kdj,
+    'vol': evaluate_vol,
+}
+
+def indicator_params(name, params=None):
+    """
+    Full parameter set an indicator is evaluated with: its defaults updated with params
+    """
+    defaults = {key: parameter.default for key, parameter in inspect.signature(INDICATORS[name]).parameters.items()
+                if parameter.default is not inspect.Parameter.empty}
+    return {**defaults, **(params or {})}
+
+def process_stock(symbol, data, indicators=tuple(INDICATORS), params=None, lookback=True):
+    """
+    Evaluate every selected indicator on the same data of one symbol
+    With lookback each indicator only sees the bars it needs for converged last values
+    """
+    params = params or {}
+    row = {'Symbol': symbol}
+    if data.empty:
+        return row
+    row['Date'] = data.index[-1]
+    if len(data) <= MIN_BARS:
+        return row
+    for name in indicators:
+        indicator_params = params.get(name, {})
+        window = data.tail(min_history(name, SIGNAL_DAYS, **indicator_params)) if lookback else data
+        try:
+            signal, value = INDICATORS[name](window, **indicator_params)
+        except Exception as e:
+            logging.error(f"Error processing {name.upper()} for {symbol}: {str(e)}")
+            signal, value = '', float('nan')
+        row[f"{name.upper()} Signal"] = signal
+        row[f"{name.upper()} Value"] = value
+    return row
+
+def scan(symbols=None, indicators=tuple(INDICATORS), params=None, fetch=price_store.refresh_chunk, lookback=True, **kwargs):
+    """
+    Load every symbol once (the listed stocks passing the prefilter by default) and evaluate the selected indicators on it
+    Returns one row per symbol with the date of its last bar and a signal and last value column for each indicator
+    """
+    symbols = eligible_symbols() if symbols is None else symbols
+    unknown = set(indicators) - set(INDICATORS)
+    if unknown:
+        raise ValueError(f"Unknown indicators: {sorted(unknown)}")
+    compute = functools.partial(process_stock, indicators=tuple(indicators), params=params, lookback=lookback)
+    results = pipeline.run_pipeline(symbols, fetch, compute, **kwargs)
+    return pd.DataFrame(results).set_index('Symbol').sort_index() if results else pd.DataFrame()
+
+def scan_panel(symbols=None, indicators=tuple(INDICATORS), params=None, fetch=price_store.refresh_chunk, lookback=True,
+               chunk_size=PANEL_CHUNK_SIZE):
+    """
+    Same result as scan, but every chunk of symbols is evaluated at once on a dates x symbols panel
+    With lookback the panel only holds the bars the slowest selected indicator needs
+    """
+    symbols = eligible_symbols() if symbols is None else symbols
+    unknown = set(indicators) - set(INDICATORS)
+    if unknown:
+        raise ValueError(f"Unknown indicators: {sorted(unknown)}")
+    params = params or {}
+    # Keep more than MIN_BARS bars so the panel engine still skips the same short histories
+    window = max([min_history(name, SIGNAL_DAYS, **params.get(name, {})) for name in indicators] + [MIN_BARS + 1])
+    tables = []
+    for chunk in chunked(symbols, chunk_size):
+        instrument.count('symbols', len(chunk))
+        with instrument.timer('fetch', chunk):
+            frames = fetch(chunk)
+        instrument.count('empty_frames', len(chunk) - len(frames))
+        if lookback:
+            frames = {symbol: data.tail(window) for symbol, data in frames.items()}
+        if frames:
+            with instrument.timer('panel_build', list(frames)):
+                panel = build_panel(frames)
+            with instrument.timer('compute', list(frames)):
+                tables.append(panel_scan(panel, indicators, params, days=SIGNAL_DAYS, min_bars=MIN_BARS))
+    return pd.concat(tables).sort_index() if tables else pd.DataFrame()
+
+def _scan_slice(start, stop, indicators, params):
+    """
+    Panel scan of one slice of the shared panel the worker is attached to
+    """
+    return panel_scan(shared_panel.worker_panel(start, stop), indicators, params, days=SIGNAL_DAYS, min_bars=MIN_BARS)
+
+def scan_shared(symbols=None, indicators=tuple(INDICATORS), params=None, fetch=price_store.refresh_chunk, lookback=True,
+                compute_workers=None, chunk_size=PANEL_CHUNK_SIZE, slice_size=None, backing='shm'):
+    """
+    Same result as scan_panel, but all symbols are loaded first into one shared memory panel
+    and worker processes scan slices of it in place, so no price data is pickled or copied per worker
+    """
+    symbols = eligible_symbols() if symbols is None else symbols
+    unknown = set(indicators) - set(INDICATORS)
+    if unknown:
+        raise ValueError(f"Unknown indicators: {sorted(unknown)}")
+    params = params or {}
+    window = max([min_history(name, SIGNAL_DAYS, **params.get(name, {})) for name in indicators] + [MIN_BARS + 1])
+    compute_workers = compute_workers or cpu_count()
+    frames = {}
+    for chunk in chunked(symbols, chunk_size):
+        instrument.count('symbols', len(chunk))
+        with instrument.timer('fetch', chunk):
+            fetched = fetch(chunk)
+        instrument.count('empty_frames', len(chunk) - len(fetched))
+        frames.update({symbol: data.tail(window) for symbol, data in fetched.items()} if lookback else fetched)
+    if not frames:
+        return pd.DataFrame()
+    with instrument.timer('panel_build', list(frames)):
+        shared = shared_panel.SharedPanel.from_frames(frames, backing=backing)
+    del frames
+    with shared:
+        # A few slices per worker keeps them busy without making the slices small
+        slice_size = slice_size or max(1, -(-len(shared.symbols) // (4 * compute_workers)))
+        slices = [(start, min(start + slice_size, len(shared.symbols))) for start in range(0, len(shared.symbols), slice_size)]
+        with instrument.timer('compute'), ProcessPoolExecutor(max_workers=compute_workers, initializer=shared_panel.init_worker,
+                                                              initargs=(shared.handle,)) as executor:
+            futures = [executor.submit(_scan_slice, start, stop, tuple(indicators), params) for start, stop in slices]
+            tables = [future.result() for future in futures]
+    return pd.concat(tables).sort_index()
+
+def budget_chunks(symbols, bars=None, memory_mb=MEMORY_MB, store_dir=price_store.STORE_DIR):
+    """
+    Read the stored symbols in chunks whose panel fits in memory_mb while it is evaluated, yields dicts of symbol -> bars
+    A panel has a row for every date of any symbol in it, so a chunk is charged its symbols x the union of their dates
+    and symbols with disjoint histories make smaller chunks than symbols sharing one calendar
+    bars caps the bars read per symbol when only a lookback window is needed
+    """
+    budget = memory_mb * 2 ** 20
+    frames, dates = {}, set()
+    for symbol in symbols:
+        with instrument.timer('fetch', [symbol]):
+            data = price_store.load_tail(symbol, bars, list(FIELDS), store_dir)
+        if data.empty:
+            continue
+        merged = dates.union(data.index.to_numpy().view('i8').tolist())
+        if frames and (len(frames) + 1) * len(merged) * BYTES_PER_BAR > budget:
+            yield frames
+            frames, merged = {}, set(data.index.to_numpy().view('i8').tolist())
+        frames[symbol] = data
+        dates = merged
+    if frames:
+        yield frames
+
+def scan_chunked(symbols=None, indicators=tuple(INDICATORS), params=None, lookback=True, memory_mb=MEMORY_MB,
+                 store_dir=price_store.STORE_DIR, spill_dir=SPILL_DIR):
+    """
+    Same result as scan_panel for universes that do not fit in memory: the symbols are read from the price store in
+    chunks sized to memory_mb, each chunk is evaluated on its own panel and its result table spilled to disk, and the
+    spilled tables are merged at the end
+    With lookback only the row groups holding the lookback window are read, so peak memory stays near memory_mb
+    whatever the number of symbols and the length of their histories
+    The store is read as it is, bring it up to date first with price_store.refresh_store
+    """
+    symbols = eligible_symbols() if symbols is None else symbols
+    unknown = set(indicators) - set(INDICATORS)
+    if unknown:
+        raise ValueError(f"Unknown indicators: {sorted(unknown)}")
+    params = params or {}
+    window = max([min_history(name, SIGNAL_DAYS, **params.get(name, {})) for name in indicators] + [MIN_BARS + 1])
+    bars = window if lookback else None
+    instrument.count('symbols', len(symbols))
+    os.makedirs(spill_dir, exist_ok=True)
+    spill = tempfile.mkdtemp(prefix="scan-", dir=spill_dir)
+    try:
+        parts = []
+        scanned = 0
+        for frames in budget_chunks(symbols, bars, memory_mb, store_dir):
+            chunk = list(frames)
+            scanned += len(chunk)
+            with instrument.timer('panel_build', chunk):
+                panel = build_panel(frames)
+            del frames
+            with instrument.timer('compute', chunk):
+                table = panel_scan(panel, indicators, params, days=SIGNAL_DAYS, min_bars=MIN_BARS)
+            del panel
+            with instrument.timer('spill', chunk):
+                path = os.path.join(spill, f"part-{len(parts):05d}.parquet")
+                table.to_parquet(path)
+                parts.append(path)
+        instrument.count('empty_frames', len(symbols) - scanned)
+        logging.info(f"Scanned {scanned} symbols in {len(parts)} chunks of at most {memory_mb} MB")
+        # One row per symbol, so the merged table is small next to the bars even for the whole universe
+        with instrument.timer('merge'):
+            tables = [pd.read_parquet(path) for path in parts]
+        return pd.concat(tables).sort_index() if tables else pd.DataFrame()
+    finally:
+        shutil.rmtree(spill, ignore_errors=True)
+
+def make_fetch(provider='yahoo', offline=False, **kwargs):
+    """
+    Fetch function for a scan: Yahoo Finance (yfinance or the http client) goes through the local price store, other providers are read directly
+    """
+    if offline:
+        return price_store.load_chunk
+    if provider in ('yahoo', 'http'):
+        return functools.partial(price_store.refresh_chunk, provider=get_provider(provider, **kwargs))
+    return get_provider(provider, **kwargs).fetch
+
+def signal_lists(table, name):
+    """
+    Buyable and sellable symbols of one indicator in a combined result table
+    """
+    column = f"{name.upper()} Signal"
+    if column not in table:
+        return [], []
+    return table.index[table[column] == 'Buy'].tolist(), table.index[table[column] == 'Sell'].tolist()
+
+# Main program
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Scan all listed US stocks with several indicators in one pass")
+    parser.add_argument('--indicators', nargs='+', default=list(INDICATORS), choices=list(INDICATORS))
+    parser.add_argument('--symbols', nargs='+', help="Symbols to scan, defaults to all listed US stocks")
+    parser.add_argument('--no-prefilter', action='store_true', help="Scan every listed stock instead of the ones passing the prefilter")
+    parser.add_argument('--security-types', nargs='+', default=list(SECURITY_TYPES), help="Security types the prefilter keeps")
+    parser.add_argument('--min-price', type=float, default=MIN_PRICE, help="Minimum last close the prefilter keeps")
+    parser.add_argument('--min-dollar-volume', type=float, default=MIN_DOLLAR_VOLUME, help="Minimum average daily dollar volume the prefilter keeps")
+    parser.add_argument('--offline', action='store_true', help="Only read the local price store")
+    parser.add_argument('--provider', choices=list(PROVIDERS), default='yahoo', help="Data provider the bars come from")
+    parser.add_argument('--data-dir', help="Directory of the local provider")
+    parser.add_argument('--base-url', help="Chart API URL of the http provider, e.g. a local stub_server.py")
+    parser.add_argument('--rate', type=float, help="Requests per second of the http provider across all fetch threads")
+    parser.add_argument('--count', type=int, default=10000, help="Number of symbols of the synthetic provider")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the synthetic provider")
+    parser.add_argument('--engine', choices=['pipeline', 'panel', 'shared', 'chunked'], default='pipeline',
+                        help="Evaluate symbol by symbol in a process pool, vectorized over a price panel, "
+                             "vectorized by worker processes over slices of one shared memory panel, "
+                             "or vectorized over chunks of the price store sized to --memory-mb")
+    parser.add_argument('--memory-mb', type=float, default=MEMORY_MB, help="Memory budget of the chunked engine in MB")
+    parser.add_argument('--output', help="Write the combined result table to this CSV file")
+    parser.add_argument('--kernels', choices=ENGINES, default=get_engine(),
+                        help="Implementation of the per-symbol indicator functions of the pipeline engine")
+    parser.add_argument('--cache', nargs='?', const=indicator_cache.CACHE_DIR,
+                        help="Cache the indicator results in this directory (default indicator_cache/) and reuse them for unchanged bars")
+    parser.add_argument('--fresh', action='store_true',
+                        help="Start over instead of resuming an interrupted run with the same arguments (pipeline engine)")
+    parser.add_argument('--no-history', action='store_true', help="Do not append the results to the signal history")
+    parser.add_argument('--report', help="Write the run report to this JSON file, defaults to reports/scan-<timestamp>.json")
+    parser.add_argument('--profile', help="Dump a profile of the main process, .prof for cProfile or .html for pyinstrument")
+    args = parser.parse_args()
+    set_engine(args.kernels)
+    if args.cache:
+        indicator_cache.set_cache(args.cache)
+
+    logging.info("Starting combined analysis")
+    start_time = time.time()
+
+    provider_args = {'local': {'directory': args.data_dir}, 'synthetic': {'seed': args.seed},
+                     'http': {'base_url': args.base_url, 'rate': args.rate}}.get(args.provider, {})
+    fetch = make_fetch(args.provider, args.offline, **provider_args)
+    symbols = args.symbols
+    if symbols is None and args.provider == 'synthetic':
+        symbols = synthetic_symbols(args.count)
+    elif symbols is None:
+        symbols = get_all_listed_us_stocks() if args.no_prefilter else eligible_symbols(
+            security_types=args.security_types, min_price=args.min_price, min_dollar_volume=args.min_dollar_volume)
+    run = {'pipeline': scan, 'panel': scan_panel, 'shared': scan_shared, 'chunked': scan_chunked}[args.engine]
+    # The chunked engine reads the price store itself instead of calling fetch
+    kwargs = {} if args.engine == 'chunked' else {'fetch': fetch}
+    if args.engine == 'chunked':
+        if args.provider not in ('yahoo', 'http'):
+            parser.error("the chunked engine reads the price store, which only the yahoo and http providers fill")
+        if not args.offline:
+            price_store.refresh_store(symbols, provider=get_provider(args.provider, **provider_args))
+        kwargs['memory_mb'] = args.memory_mb
+    if args.engine == 'pipeline':
+        # Checkpointed per argument set, so rerunning the same command resumes an interrupted scan
+        run_args = {key: value for key, value in vars(args).items() if key not in ('output', 'report', 'profile', 'fresh', 'no_history')}
+        kwargs['checkpoint'] = open_checkpoint("scan", symbols, run_args, resume=not args.fresh)
+    with instrument.record_run("scan", profile=args.profile) as stats:
+        table = run(symbols, args.indicators, **kwargs)
+    for name in args.indicators:
+        buyable, sellable = signal_lists(table, name)
+        logging.info(f"{name.upper()} Buyable Stocks: {buyable}")
+        logging.info(f"{name.upper()} Sellable Stocks: {sellable}")
+    if args.output:
+        table.to_csv(args.output)
+    if not args.no_history and not table.empty:
+        params = {name: indicator_params(name) for name in args.indicators}
+        signal_store.append_signals(signal_store.to_records(table, params))
+
+    end_time = time.time()
+    logging.info(f"Analysis completed. Execution time: {end_time - start_time:.2f} seconds")
+    logging.info(stats.summary())
+    logging.info(f"Run report saved to {stats.save(args.report)}")
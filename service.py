@@ -0,0 +1,305 @@
+import json
+import math
+import time
+import logging
+import argparse
+import threading
+import pandas as pd
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import price_store
+import instrument
+import indicator_cache
+import scan
+from indicators import set_engine, get_engine, ENGINES, min_history, SIGNAL_DAYS
+from prefilter import eligible_symbols
+from providers import synthetic_symbols, PROVIDERS
+
+# Port of the query API, it only listens on localhost
+PORT = 8787
+# Minutes between scheduled rescans of the universe
+REFRESH_MINUTES = 60
+# Bars kept in memory per symbol, enough for every indicator on default or moderately changed parameters
+# Queries needing more read the symbol from the price store instead
+PRICE_BARS = 250
+
+def _warm_worker():
+    # Import the indicator code and touch pandas once, so the first task after a refresh is not slower than the rest
+    import scan
+    scan.process_stock('WARMUP', pd.DataFrame())
+
+def _json_value(value):
+    if isinstance(value, pd.Timestamp):
+        return f"{value:%Y-%m-%d}"
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value.item() if hasattr(value, 'item') else value
+
+class ScanService:
+    """
+    Long running scan: a process pool that stays up between refreshes, the latest scan table and the
+    recent bars of every symbol in memory, and a thread rescanning the universe every refresh_minutes
+    Queries on default parameters are answered from the table, others are computed on the bars in memory
+    """
+    def __init__(self, symbols=None, indicators=tuple(scan.INDICATORS), fetch=price_store.refresh_chunk,
+                 refresh_minutes=REFRESH_MINUTES, compute_workers=None, price_bars=PRICE_BARS):
+        self.symbols = symbols
+        self.indicators = tuple(indicators)
+        self.fetch = fetch
+        self.refresh_minutes = refresh_minutes
+        self.compute_workers = compute_workers
+        self.price_bars = price_bars
+        self.table = pd.DataFrame()
+        self.prices = {}
+        self.last_refresh = None
+        self.last_duration = None
+        self.refreshing = False
+        self.executor = None
+        # Timings of the queries computed on the spot, kept apart from the run report of the refresh going on meanwhile
+        self.query_stats = instrument.RunStats("queries")
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def _pool(self):
+        """
+        The warm process pool, replaced when a worker crash broke it
+        """
+        if self.executor is not None:
+            try:
+                self.executor.submit(int).result()
+                return self.executor
+            except (BrokenProcessPool, RuntimeError):
+                logging.warning("Worker pool broken, starting a new one")
+                self.executor.shutdown(wait=False)
+        self.executor = ProcessPoolExecutor(max_workers=self.compute_workers, initializer=_warm_worker)
+        return self.executor
+
+    def _remember(self, frames):
+        tails = {symbol: data.tail(self.price_bars) for symbol, data in frames.items() if not data.empty}
+        with self._lock:
+            self.prices.update(tails)
+        return frames
+
+    def refresh(self):
+        """
+        Fetch and rescan every symbol on the warm pool, then swap in the new table and bars
+        Queries keep being answered from the previous table meanwhile
+        """
+        with self._refresh_lock:
+            self.refreshing = True
+            start_time = time.time()
+            try:
+                symbols = self.symbols if self.symbols is not None else eligible_symbols()
+                fetch = lambda chunk: self._remember(self.fetch(chunk))
+                with instrument.record_run("service") as stats:
+                    table = scan.scan(symbols, self.indicators, fetch=fetch, executor=self._pool(),
+                                      compute_workers=self.compute_workers)
+                with self._lock:
+                    self.table = table
+                    # Symbols that left the universe drop out of the bars kept in memory
+                    self.prices = {symbol: self.prices[symbol] for symbol in table.index if symbol in self.prices}
+                    self.last_refresh = pd.Timestamp.now()
+                    self.last_duration = time.time() - start_time
+                logging.info(f"Refreshed {len(table)} symbols in {self.last_duration:.2f} seconds")
+                logging.info(stats.summary())
+            finally:
+                self.refreshing = False
+
+    def _bars(self, symbol, bars):
+        with self._lock:
+            data = self.prices.get(symbol)
+        if data is None or len(data) < bars:
+            stored = price_store.load_prices(symbol)
+            if not stored.empty:
+                data = stored
+        return data if data is not None else pd.DataFrame()
+
+    def signals(self, symbols, indicators=None, params=None):
+        """
+        Row of the newest bar per symbol with the value and signal of each indicator
+        Default parameters read the refreshed table, symbols missing from it and custom parameters are computed
+        here on the bars in memory (or in the price store), which takes milliseconds per symbol with the indicator cache
+        Raises ValueError for parameters of an indicator that is not queried
+        """
+        indicators = tuple(indicators or self.indicators)
+        unused = sorted(set(params or {}) - set(indicators))
+        if unused:
+            raise ValueError(f"Parameters given for indicators not queried: {unused}")
+        params = {name: value for name, value in (params or {}).items() if value}
+        columns = ['Date'] + [f"{name.upper()} {kind}" for name in indicators for kind in ('Signal', 'Value')]
+        with self._lock:
+            table = self.table
+        rows = {}
+        for symbol in symbols:
+            if not params and symbol in table.index and set(indicators) <= set(self.indicators):
+                rows[symbol] = table.loc[symbol].reindex(columns).to_dict()
+                continue
+            bars = max(min_history(name, SIGNAL_DAYS, **params.get(name, {})) for name in indicators)
+            start_time = time.perf_counter()
+            row = scan.process_stock(symbol, self._bars(symbol, bars), indicators, params)
+            self.query_stats.add_time('compute', time.perf_counter() - start_time, [symbol])
+            rows[symbol] = {column: row.get(column) for column in columns}
+        return {symbol: {key: _json_value(value) for key, value in row.items()} for symbol, row in rows.items()}
+
+    def lists(self, name):
+        """
+        Buyable and sellable symbols of one indicator in the refreshed table
+        """
+        if name not in scan.INDICATORS:
+            raise ValueError(f"Unknown indicator: {name}")
+        with self._lock:
+            table = self.table
+        buyable, sellable = scan.signal_lists(table, name)
+        return {'buy': buyable, 'sell': sellable}
+
+    def status(self):
+        compute = self.query_stats.report()['stages'].get('compute', {})
+        with self._lock:
+            return {'symbols': len(self.table), 'prices_cached': len(self.prices), 'indicators': list(self.indicators),
+                    'last_refresh': self.last_refresh.isoformat() if self.last_refresh is not None else None,
+                    'last_duration': self.last_duration, 'refreshing': self.refreshing,
+                    'refresh_minutes': self.refresh_minutes, 'symbols_computed': compute.get('calls', 0),
+                    'compute_seconds': compute.get('seconds', 0.0)}
+
+    def request_refresh(self):
+        self._wake.set()
+
+    def _schedule(self):
+        while not self._stopped.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                logging.error(f"Refresh failed: {str(e)}")
+            self._wake.wait(self.refresh_minutes * 60)
+            self._wake.clear()
+
+    def start(self):
+        """
+        Start the worker pool and the refresh thread, the first refresh runs right away
+        """
+        self._pool()
+        self._thread = threading.Thread(target=self._schedule, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+
+def parse_params(query):
+    """
+    Indicator parameters from query arguments like kdj.buy_threshold=25, as {'kdj': {'buy_threshold': 25}}
+    Raises ValueError for an unknown indicator or a parameter its evaluation function does not take
+    """
+    params = {}
+    for key, values in query.items():
+        if '.' not in key:
+            continue
+        name, parameter = key.split('.', 1)
+        if name not in scan.INDICATORS:
+            raise ValueError(f"Unknown indicator: {name}")
+        if parameter not in scan.indicator_params(name):
+            raise ValueError(f"Unknown {name} parameter: {parameter}, expected one of {sorted(scan.indicator_params(name))}")
+        value = values[-1]
+        params.setdefault(name, {})[parameter] = int(value) if value.lstrip('-').isdigit() else float(value)
+    return params
+
+def make_server(service, host="127.0.0.1", port=PORT):
+    """
+    HTTP server answering JSON queries on a ScanService:
+      GET  /signals?symbols=AAPL,MSFT&indicators=kdj,rsi&kdj.buy_threshold=25
+      GET  /lists?indicator=kdj
+      GET  /status
+      POST /refresh
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            try:
+                if url.path == '/signals':
+                    symbols = [symbol.strip().upper() for value in query.get('symbols', []) for symbol in value.split(',') if symbol.strip()]
+                    indicators = [name for value in query.get('indicators', []) for name in value.split(',') if name]
+                    unknown = set(indicators) - set(scan.INDICATORS)
+                    if unknown:
+                        return self._send(400, {'error': f"Unknown indicators: {sorted(unknown)}"})
+                    self._send(200, service.signals(symbols, indicators, parse_params(query)))
+                elif url.path == '/lists':
+                    self._send(200, service.lists(query.get('indicator', ['kdj'])[-1]))
+                elif url.path == '/status':
+                    self._send(200, service.status())
+                else:
+                    self._send(404, {'error': f"Unknown path {url.path}"})
+            except ValueError as e:
+                self._send(400, {'error': str(e)})
+
+        def do_POST(self):
+            if urlparse(self.path).path != '/refresh':
+                return self._send(404, {'error': f"Unknown path {self.path}"})
+            service.request_refresh()
+            self._send(202, {'refreshing': True})
+
+        def log_message(self, format, *args):
+            logging.debug(format % args)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    return server
+
+# Main program
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Keep the scan warm and answer signal queries over HTTP on localhost")
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--indicators', nargs='+', default=list(scan.INDICATORS), choices=list(scan.INDICATORS))
+    parser.add_argument('--symbols', nargs='+', help="Symbols to keep scanned, defaults to the listed stocks passing the prefilter")
+    parser.add_argument('--refresh-minutes', type=float, default=REFRESH_MINUTES, help="Minutes between scheduled rescans")
+    parser.add_argument('--workers', type=int, help="Worker processes kept running, defaults to the CPU count")
+    parser.add_argument('--offline', action='store_true', help="Only read the local price store")
+    parser.add_argument('--provider', choices=list(PROVIDERS), default='yahoo', help="Data provider the bars come from")
+    parser.add_argument('--data-dir', help="Directory of the local provider")
+    parser.add_argument('--base-url', help="Chart API URL of the http provider")
+    parser.add_argument('--rate', type=float, help="Requests per second of the http provider")
+    parser.add_argument('--count', type=int, default=10000, help="Number of symbols of the synthetic provider")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the synthetic provider")
+    parser.add_argument('--kernels', choices=ENGINES, default=get_engine(), help="Implementation of the indicator functions")
+    parser.add_argument('--cache', nargs='?', const=indicator_cache.CACHE_DIR,
+                        help="Cache the indicator results in this directory (default indicator_cache/)")
+    args = parser.parse_args()
+    set_engine(args.kernels)
+    if args.cache:
+        indicator_cache.set_cache(args.cache)
+
+    provider_args = {'local': {'directory': args.data_dir}, 'synthetic': {'seed': args.seed},
+                     'http': {'base_url': args.base_url, 'rate': args.rate}}.get(args.provider, {})
+    symbols = args.symbols
+    if symbols is None and args.provider == 'synthetic':
+        symbols = synthetic_symbols(args.count)
+    service = ScanService(symbols, args.indicators, scan.make_fetch(args.provider, args.offline, **provider_args),
+                          args.refresh_minutes, args.workers)
+    service.start()
+    server = make_server(service, port=args.port)
+    logging.info(f"Serving http://127.0.0.1:{args.port}/signals?symbols=AAPL,MSFT&indicators=kdj")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.stop()
@@ -0,0 +1,135 @@
+import os
+import sys
+import uuid
+import tempfile
+import numpy as np
+import pandas as pd
+from multiprocessing import shared_memory
+from panel import FIELDS
+
+# Where the panel lives: a POSIX shared memory block or a memory-mapped file
+BACKINGS = ('shm', 'mmap')
+
+class SharedPanel:
+    """
+    Price panel in one block of shared memory laid out as fields x symbols x dates (or bar positions, see panel.align_bars)
+    Every field is a dates x symbols DataFrame view and the history of every symbol is contiguous
+    Only the small handle is pickled to worker processes, they attach to the same memory instead of copying it
+    """
+    def __init__(self, handle, owner=False):
+        self.handle = handle
+        self.owner = owner
+        self.symbols = pd.Index(handle['symbols'], name='Symbol')
+        self.dates = pd.Index(handle['dates'], name=handle.get('index_name', 'Date'))
+        shape = (len(handle['fields']), len(self.symbols), len(self.dates))
+        self._shm = None
+        if handle['backing'] == 'shm':
+            if owner:
+                self._shm = shared_memory.SharedMemory(name=handle['name'], create=True, size=max(8 * int(np.prod(shape)), 1))
+            else:
+                self._shm = _attach_shm(handle['name'])
+            self.array = np.ndarray(shape, dtype=np.float64, buffer=self._shm.buf)
+        else:
+            self.array = np.memmap(handle['name'], dtype=np.float64, mode='w+' if owner else 'r', shape=shape)
+        if not owner:
+            self.array.flags.writeable = False
+
+    @classmethod
+    def create(cls, symbols, dates, fields=FIELDS, backing='shm', directory=None):
+        """
+        Allocate an empty (all NaN) panel for the given symbols and dates
+        """
+        if backing not in BACKINGS:
+            raise ValueError(f"Unknown panel backing: {backing}")
+        name = f"rsi_panel_{uuid.uuid4().hex[:16]}"
+        if backing == 'mmap':
+            name = os.path.join(directory or tempfile.gettempdir(), name + ".f8")
+        handle = {
+            'backing': backing,
+            'name': name,
+            'fields': list(fields),
+            'symbols': list(symbols),
+            'dates': pd.Index(dates).to_numpy(),
+            'index_name': getattr(dates, 'name', None) or 'Date',
+        }
+        shared = cls(handle, owner=True)
+        shared.array[:] = np.nan
+        return shared
+
+    @classmethod
+    def from_frames(cls, frames, fields=FIELDS, backing='shm', directory=None):
+        """
+        Copy a dict of symbol -> DataFrame into a new shared panel on the union of their dates
+        """
+        frames = {symbol: data for symbol, data in frames.items() if not data.empty}
+        dates = pd.DatetimeIndex(np.unique(np.concatenate([data.index.to_numpy() for data in frames.values()])) if frames else [])
+        shared = cls.create(list(frames), dates, fields, backing, directory)
+        for j, data in enumerate(frames.values()):
+            rows = dates.get_indexer(data.index)
+            for f, field in enumerate(fields):
+                if field in data:
+                    shared.array[f, j, rows] = data[field].to_numpy(dtype=np.float64)
+        return shared
+
+    @classmethod
+    def from_panel(cls, panel, backing='shm', directory=None):
+        """
+        Copy a dict of field -> dates x symbols DataFrame (panel.build_panel) into a new shared panel
+        """
+        fields = list(panel)
+        close = panel[fields[0]]
+        shared = cls.create(close.columns, close.index, fields, backing, directory)
+        for f, field in enumerate(fields):
+            shared.array[f] = panel[field].reindex(index=close.index, columns=close.columns).to_numpy(dtype=np.float64).T
+        return shared
+
+    def panel(self, start=0, stop=None):
+        """
+        Dict of field -> dates x symbols DataFrame for the symbols in [start, stop), without copying
+        """
+        columns = self.symbols[start:stop]
+        return {field: pd.DataFrame(self.array[f, start:stop].T, index=self.dates, columns=columns, copy=False)
+                for f, field in enumerate(self.handle['fields'])}
+
+    def close(self):
+        """
+        Detach from the memory, the owner also frees it
+        """
+        self.array = None
+        if self._shm is not None:
+            self._shm.close()
+            if self.owner:
+                self._shm.unlink()
+        elif self.owner and os.path.exists(self.handle['name']):
+            os.remove(self.handle['name'])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def _attach_shm(name):
+    """
+    Attach to an existing block, only its owner frees it
+    Before Python 3.13 attaching registers the block again with the resource tracker the
+    workers share with the owner, which is harmless as the owner's unlink unregisters it
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    return shared_memory.SharedMemory(name=name)
+
+_worker_panel = None
+
+def init_worker(handle):
+    """
+    ProcessPoolExecutor initializer: attach the worker to the shared panel once
+    """
+    global _worker_panel
+    _worker_panel = SharedPanel(handle)
+
+def worker_panel(start=0, stop=None):
+    """
+    View of the symbols in [start, stop) of the panel the worker is attached to
+    """
+    return _worker_panel.panel(start, stop)
@@ -0,0 +1,121 @@
+import os
+import json
+import logging
+import argparse
+import pandas as pd
+
+# Default location of the signal history, one Parquet file per scan date
+SIGNAL_DIR = "signal_history"
+
+COLUMNS = ['date', 'symbol', 'indicator', 'signal', 'value', 'params']
+# Rows are identified by these columns, a rerun on the same date replaces its earlier rows
+KEY = ['date', 'symbol', 'indicator', 'params']
+
+def partition_path(day, signal_dir=SIGNAL_DIR):
+    return os.path.join(signal_dir, f"{pd.Timestamp(day):%Y-%m-%d}.parquet")
+
+def partition_dates(signal_dir=SIGNAL_DIR):
+    """
+    Dates with stored signals, oldest first
+    """
+    if not os.path.isdir(signal_dir):
+        return []
+    return sorted(pd.Timestamp(file[:-len('.parquet')]) for file in os.listdir(signal_dir) if file.endswith('.parquet'))
+
+def _compact(records):
+    """
+    Sorted rows with categorical text columns, so a partition stays small and filters can skip row groups
+    """
+    records = records.sort_values(['indicator', 'signal', 'symbol', 'params']).reset_index(drop=True)
+    for column in ('symbol', 'indicator', 'signal', 'params'):
+        records[column] = records[column].astype('category')
+    records['value'] = records['value'].astype('float64')
+    return records[COLUMNS]
+
+def to_records(table, params=None):
+    """
+    Long format of a scan result table: one row per symbol and indicator with the signal,
+    its last value and the parameters (as JSON) the indicator was evaluated with
+    Symbols that were not evaluated (no bars or too short a history) are left out
+    """
+    params = params or {}
+    frames = []
+    for column in table.columns:
+        if not column.endswith(' Signal'):
+            continue
+        name = column[:-len(' Signal')]
+        part = pd.DataFrame({
+            'date': pd.to_datetime(table['Date']).dt.normalize(),
+            'symbol': table.index,
+            'indicator': name.lower(),
+            'signal': table[column],
+            'value': table[f"{name} Value"],
+            'params': json.dumps(params.get(name.lower(), {}), sort_keys=True),
+        })
+        frames.append(part[part['signal'].notna() & part['date'].notna()])
+    if not frames:
+        return pd.DataFrame(columns=COLUMNS)
+    return pd.concat(frames, ignore_index=True)
+
+def append_signals(records, signal_dir=SIGNAL_DIR):
+    """
+    Add signal records to the date partitions they belong to
+    Returns the dates that were written
+    """
+    os.makedirs(signal_dir, exist_ok=True)
+    written = []
+    for day, rows in records.groupby('date'):
+        path = partition_path(day, signal_dir)
+        if os.path.exists(path):
+            stored = pd.read_parquet(path)
+            rows = pd.concat([stored.astype({column: object for column in ('symbol', 'indicator', 'signal', 'params')}), rows])
+            rows = rows.drop_duplicates(KEY, keep='last')
+        _compact(rows).to_parquet(path + ".tmp", index=False)
+        os.replace(path + ".tmp", path)
+        written.append(day)
+    logging.info(f"Stored {len(records)} signal records for {len(written)} dates in {signal_dir}")
+    return written
+
+def load_signals(start=None, end=None, indicator=None, signal=None, symbols=None, signal_dir=SIGNAL_DIR):
+    """
+    Stored signal records between start and end (inclusive)
+    Only the partitions in the date range are read, and the indicator and signal filters are pushed down to the reader
+    """
+    days = [day for day in partition_dates(signal_dir)
+            if (start is None or day >= pd.Timestamp(start)) and (end is None or day <= pd.Timestamp(end))]
+    filters = []
+    if indicator is not None:
+        filters.append(('indicator', '==', indicator))
+    if signal is not None:
+        filters.append(('signal', '==', signal))
+    if symbols is not None:
+        filters.append(('symbol', 'in', list(symbols)))
+    frames = [pd.read_parquet(partition_path(day, signal_dir), filters=filters or None) for day in days]
+    frames = [frame.astype({column: object for column in ('symbol', 'indicator', 'signal', 'params')}) for frame in frames]
+    if not frames:
+        return pd.DataFrame(columns=COLUMNS)
+    return pd.concat(frames, ignore_index=True)
+
+def streak(indicator, signal, days=3, end=None, signal_dir=SIGNAL_DIR):
+    """
+    Symbols whose indicator gave the same signal on each of the last days stored dates up to end
+    e.g. streak('kdj', 'Buy', 3) for the symbols that fired KDJ Buy 3 days running
+    """
+    dates = [day for day in partition_dates(signal_dir) if end is None or day <= pd.Timestamp(end)][-days:]
+    if len(dates) < days:
+        return []
+    records = load_signals(dates[0], dates[-1], indicator, signal, signal_dir=signal_dir)
+    counts = records.drop_duplicates(['date', 'symbol'])['symbol'].value_counts()
+    return sorted(counts.index[counts == days])
+
+# Main program
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Query the stored signal history")
+    parser.add_argument('indicator', help="Indicator name, e.g. kdj")
+    parser.add_argument('signal', choices=['Buy', 'Sell'])
+    parser.add_argument('--days', type=int, default=1, help="Number of stored dates running the signal must have fired")
+    parser.add_argument('--end', help="Last date of the streak, defaults to the latest stored date")
+    args = parser.parse_args()
+    symbols = streak(args.indicator, args.signal, args.days, args.end)
+    logging.info(f"{args.indicator.upper()} {args.signal} {args.days} days running: {symbols}")
@@ -0,0 +1,330 @@
+import math
+import json
+import argparse
+from collections import deque
+from kernels import ema_step, gap_weights
+
+NAN = float('nan')
+
+def _is_nan(value):
+    return value is None or value != value
+
+def _div(a, b):
+    """
+    a / b with the inf/NaN results pandas gives instead of ZeroDivisionError
+    """
+    if _is_nan(a) or _is_nan(b):
+        return NAN
+    if b == 0:
+        return NAN if a == 0 else math.copysign(math.inf, a)
+    return a / b
+
+def _cross_signal(prev_fast, prev_slow, fast, slow, buy_condition=True, sell_condition=True):
+    """
+    Buy when the fast line crosses above the slow line, Sell when it crosses below
+    NaN comparisons are False, as in indicators.get_cross_signal
+    """
+    if prev_fast <= prev_slow and fast > slow and buy_condition:
+        return 'Buy'
+    if prev_fast >= prev_slow and fast < slow and sell_condition:
+        return 'Sell'
+    return ''
+
+class EMA:
+    """
+    Exponential moving average with the semantics of pandas ewm(span=span, adjust=False).mean()
+    Steps through kernels.ema_step, so missing values are weighed like the installed pandas does (ignore_na=False)
+    """
+    def __init__(self, span):
+        self.span = span
+        self.alpha = 2 / (span + 1)
+        self.gap_weights = gap_weights(span)
+        self.value = NAN
+        self.old_wt = 1.0
+
+    def update(self, x):
+        x = NAN if x is None else x
+        self.value, self.old_wt = ema_step(self.value, self.old_wt, x, self.alpha, self.gap_weights)
+        return self.value
+
+    def to_dict(self):
+        return {'span': self.span, 'value': self.value, 'old_wt': self.old_wt}
+
+    @classmethod
+    def from_dict(cls, state):
+        ema = cls(state['span'])
+        ema.value = state['value']
+        ema.old_wt = state['old_wt']
+        return ema
+
+class RollingWindow:
+    """
+    Ring buffer of the last n values, its statistics are NaN until n valid bars are in it
+    """
+    def __init__(self, n, values=()):
+        self.n = n
+        self.values = deque(values, maxlen=n)
+
+    def push(self, x):
+        self.values.append(x)
+
+    def full(self):
+        return len(self.values) == self.n and not any(_is_nan(v) for v in self.values)
+
+    def mean(self):
+        return sum(self.values) / self.n if self.full() else NAN
+
+    def min(self):
+        return min(self.values) if self.full() else NAN
+
+    def max(self):
+        return max(self.values) if self.full() else NAN
+
+    def to_dict(self):
+        return {'n': self.n, 'values': list(self.values)}
+
+    @classmethod
+    def from_dict(cls, state):
+        return cls(state['n'], state['values'])
+
+class RSIState:
+    """
+    Incremental version of indicators.get_rsi with the RSI(ALL) last-bar Buy/Sell rule
+    """
+    def __init__(self, period=14, buy_threshold=20, sell_threshold=80):
+        self.period = period
+        self.buy_threshold = buy_threshold
+        self.sell_threshold = sell_threshold
+        self.prev_close = NAN
+        self.gains = RollingWindow(period)
+        self.losses = RollingWindow(period)
+        self.value = NAN
+
+    def update(self, bar):
+        close = bar['Adj Close']
+        delta = close - self.prev_close if not (_is_nan(close) or _is_nan(self.prev_close)) else NAN
+        # A missing change counts as neither gain nor loss, like delta.where(delta > 0, 0)
+        self.gains.push(delta if delta > 0 else 0.0)
+        self.losses.push(-delta if delta < 0 else 0.0)
+        self.prev_close = close
+        rs = _div(self.gains.mean(), self.losses.mean())
+        self.value = 100 - 100 / (1 + rs) if not _is_nan(rs) else NAN
+        if self.value < self.buy_threshold:
+            return self.value, 'Buy'
+        elif self.value > self.sell_threshold:
+            return self.value, 'Sell'
+        return self.value, ''
+
+    def to_dict(self):
+        return {'period': self.period, 'buy_threshold': self.buy_threshold, 'sell_threshold': self.sell_threshold,
+                'prev_close': self.prev_close, 'gains': self.gains.to_dict(), 'losses': self.losses.to_dict(), 'value': self.value}
+
+    @classmethod
+    def from_dict(cls, state):
+        rsi = cls(state['period'], state['buy_threshold'], state['sell_threshold'])
+        rsi.prev_close = state['prev_close']
+        rsi.gains = RollingWindow.from_dict(state['gains'])
+        rsi.losses = RollingWindow.from_dict(state['losses'])
+        rsi.value = state['value']
+        return rsi
+
+class MACDState:
+    """
+    Incremental version of indicators.get_macd with the MACD/signal line crossing rule
+    """
+    def __init__(self, short_period=12, long_period=26, signal_period=9):
+        self.short_ema = EMA(short_period)
+        self.long_ema = EMA(long_period)
+        self.signal_ema = EMA(signal_period)
+        self.macd = NAN
+        self.signal = NAN
+
+    def update(self, bar):
+        close = bar['Adj Close']
+        prev_macd, prev_signal = self.macd, self.signal
+        self.macd = self.short_ema.update(close) - self.long_ema.update(close)
+        self.signal = self.signal_ema.update(self.macd)
+        return self.macd, _cross_signal(prev_macd, prev_signal, self.macd, self.signal)
+
+    def to_dict(self):
+        return {'short_ema': self.short_ema.to_dict(), 'long_ema': self.long_ema.to_dict(), 'signal_ema': self.signal_ema.to_dict(),
+                'macd': self.macd, 'signal': self.signal}
+
+    @classmethod
+    def from_dict(cls, state):
+        macd = cls()
+        macd.short_ema = EMA.from_dict(state['short_ema'])
+        macd.long_ema = EMA.from_dict(state['long_ema'])
+        macd.signal_ema = EMA.from_dict(state['signal_ema'])
+        macd.macd = state['macd']
+        macd.signal = state['signal']
+        return macd
+
+class KDJState:
+    """
+    Incremental version of indicators.get_kdj with the K/D crossing and J threshold rule
+    """
+    def __init__(self, n=9, m1=3, m2=3, buy_threshold=20, sell_threshold=80):
+        self.buy_threshold = buy_threshold
+        self.sell_threshold = sell_threshold
+        self.highs = RollingWindow(n)
+        self.lows = RollingWindow(n)
+        self.k_ema = EMA(m1)
+        self.d_ema = EMA(m2)
+        self.k = NAN
+        self.d = NAN
+        self.j = NAN
+
+    def update(self, bar):
+        self.highs.push(bar['High'])
+        self.lows.push(bar['Low'])
+        low_min = self.lows.min()
+        rsv = _div(bar['Close'] - low_min, self.highs.max() - low_min) * 100
+        prev_k, prev_d = self.k, self.d
+        self.k = self.k_ema.update(rsv)
+        self.d = self.d_ema.update(self.k)
+        self.j = 3 * self.k - 2 * self.d
+        return self.j, _cross_signal(prev_k, prev_d, self.k, self.d, self.j > self.buy_threshold, self.j < self.sell_threshold)
+
+    def to_dict(self):
+        return {'buy_threshold': self.buy_threshold, 'sell_threshold': self.sell_threshold,
+                'highs': self.highs.to_dict(), 'lows': self.lows.to_dict(), 'k_ema': self.k_ema.to_dict(), 'd_ema': self.d_ema.to_dict(),
+                'k': self.k, 'd': self.d, 'j': self.j}
+
+    @classmethod
+    def from_dict(cls, state):
+        kdj = cls(buy_threshold=state['buy_threshold'], sell_threshold=state['sell_threshold'])
+        kdj.highs = RollingWindow.from_dict(state['highs'])
+        kdj.lows = RollingWindow.from_dict(state['lows'])
+        kdj.k_ema = EMA.from_dict(state['k_ema'])
+        kdj.d_ema = EMA.from_dict(state['d_ema'])
+        kdj.k, kdj.d, kdj.j = state['k'], state['d'], state['j']
+        return kdj
+
+class VolumeState:
+    """
+    Incremental version of indicators.get_vol_ratio with the volume ratio thresholds
+    """
+    def __init__(self, n=20, buy_threshold=1.5, sell_threshold=0.5):
+        self.buy_threshold = buy_threshold
+        self.sell_threshold = sell_threshold
+        self.volumes = RollingWindow(n)
+        self.value = NAN
+
+    def update(self, bar):
+        volume = float(bar['Volume'])
+        self.volumes.push(volume)
+        self.value = _div(volume, self.volumes.mean())
+        if self.value > self.buy_threshold:
+            return self.value, 'Buy'
+        elif self.value < self.sell_threshold:
+            return self.value, 'Sell'
+        return self.value, ''
+
+    def to_dict(self):
+        return {'buy_threshold': self.buy_threshold, 'sell_threshold': self.sell_threshold, 'volumes': self.volumes.to_dict(), 'value': self.value}
+
+    @classmethod
+    def from_dict(cls, state):
+        vol = cls(buy_threshold=state['buy_threshold'], sell_threshold=state['sell_threshold'])
+        vol.volumes = RollingWindow.from_dict(state['volumes'])
+        vol.value = state['value']
+        return vol
+
+STATES = {
+    'rsi': RSIState,
+    'macd': MACDState,
+    'kdj': KDJState,
+    'vol': VolumeState,
+}
+
+def new_states(indicators=tuple(STATES), params=None):
+    """
+    Fresh indicator states for one symbol
+    """
+    params = params or {}
+    return {name: STATES[name](**params.get(name, {})) for name in indicators}
+
+def update_states(states, bar):
+    """
+    Feed one bar to every indicator state of a symbol and return {indicator: (value, signal)}
+    """
+    return {name: state.update(bar) for name, state in states.items()}
+
+def warm_up(states, data):
+    """
+    Feed a history of bars to the indicator states, returns the output of the last bar
+    """
+    output = {}
+    # Plain dicts are much cheaper to build than the Series iterrows gives
+    for bar in data.to_dict('records'):
+        output = update_states(states, bar)
+    return output
+
+def states_to_dict(states):
+    """
+    JSON-able form of the indicator states of one symbol ({indicator: state})
+    """
+    return {name: {'type': name, 'state': state.to_dict()} for name, state in states.items()}
+
+def states_from_dict(payload):
+    """
+    Indicator states of one symbol from the output of states_to_dict
+    """
+    return {name: STATES[item['type']].from_dict(item['state']) for name, item in payload.items()}
+
+def save_states(states, path):
+    """
+    Write the indicator states of many symbols ({symbol: {indicator: state}}) to a JSON file
+    """
+    with open(path, 'w') as f:
+        json.dump({symbol: states_to_dict(symbol_states) for symbol, symbol_states in states.items()}, f)
+
+def load_states(path):
+    """
+    Read the indicator states written by save_states
+    """
+    with open(path) as f:
+        return {symbol: states_from_dict(payload) for symbol, payload in json.load(f).items()}
+
+def check_equivalence(data, rtol=1e-9, atol=1e-9):
+    """
+    Compare the states fed one bar at a time with the batch indicator functions on one symbol
+    Returns the largest absolute difference of every indicator value, raises AssertionError on a mismatch
+    """
+    import numpy as np
+    from indicators import get_rsi, get_macd, get_kdj, get_vol_ratio
+    states = new_states()
+    outputs = [update_states(states, bar) for bar in data.to_dict('records')]
+    reference = {
+        'rsi': get_rsi(data).to_numpy(),
+        'macd': get_macd(data)['MACD'].to_numpy(),
+        'kdj': get_kdj(data)['J'].to_numpy(),
+        'vol': get_vol_ratio(data).to_numpy(),
+    }
+    differences = {}
+    for name, expected in reference.items():
+        result = np.array([output[name][0] for output in outputs], dtype=np.float64)
+        np.testing.assert_allclose(result, expected, rtol=rtol, atol=atol, err_msg=f"streaming {name}")
+        both = np.isfinite(expected) & np.isfinite(result)
+        differences[name] = float(np.abs(result[both] - expected[both]).max()) if both.any() else 0.0
+    return differences
+
+# Main program
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the incremental states against the batch indicator functions on synthetic data")
+    parser.add_argument('--symbols', type=int, default=20, help="Number of synthetic symbols to check")
+    parser.add_argument('--bars', type=int, default=500)
+    args = parser.parse_args()
+    from providers import SyntheticProvider, synthetic_symbols
+    worst = {}
+    for data in SyntheticProvider(bars=args.bars).fetch(synthetic_symbols(args.symbols)).values():
+        # Also check a flat stretch (RSV 0 / 0 for the KDJ) and a missing bar, where the EMAs skip values
+        gapped = data.copy()
+        price_columns = [column for column in gapped.columns if column != 'Volume']
+        gapped.iloc[len(gapped) // 3:len(gapped) // 3 + 12, gapped.columns.get_indexer(price_columns)] = 50.0
+        gapped.iloc[2 * len(gapped) // 3] = NAN
+        for frame in (data, gapped):
+            for name, difference in check_equivalence(frame).items():
+                worst[name] = max(worst.get(name, 0.0), difference)
+    print("  ".join(f"{name} {difference:.1e}" for name, difference in worst.items()))
@@ -0,0 +1,129 @@
+import json
+import math
+import random
+import logging
+import argparse
+import threading
+import pandas as pd
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from http_client import TokenBucket
+from providers import SyntheticProvider
+
+class StubChartServer:
+    """
+    Local HTTP server answering chart API requests with synthetic bars and throttling like Yahoo Finance:
+    beyond rate requests per second it answers 429 with a Retry-After header, and a share
+    of empty_rate responses come back without bars
+    Symbols starting with UNKNOWN get a 404
+    """
+    def __init__(self, rate=20.0, burst=None, empty_rate=0.0, seed=0, host="127.0.0.1", port=0):
+        self.bucket = TokenBucket(rate, burst or rate)
+        self.empty_rate = empty_rate
+        self.provider = SyntheticProvider(seed=seed)
+        self.random = random.Random(seed)
+        self.stats = {'requests': 0, 'throttled': 0, 'empty': 0}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v8/finance/chart"
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def chart(self, symbol, query):
+        """
+        Chart API payload of the synthetic bars of a symbol, None for an unknown symbol
+        """
+        if symbol.startswith('UNKNOWN'):
+            return None
+        data = self.provider.generate(symbol)
+        if 'period1' in query:
+            data = data[data.index >= pd.Timestamp(int(query['period1'][0]), unit='s').normalize()]
+        with self._lock:
+            empty = self.random.random() < self.empty_rate
+        if empty:
+            self._count('empty')
+            data = data.iloc[:0]
+        # Session open in UTC for a New York listing, as the real API reports it
+        timestamps = [int(day.timestamp()) + 13 * 3600 + 1800 for day in data.index]
+        return {'chart': {'result': [{
+            'meta': {'symbol': symbol, 'gmtoffset': -14400},
+            'timestamp': timestamps,
+            'indicators': {
+                'quote': [{column.lower(): data[column].tolist() for column in ('Open', 'High', 'Low', 'Close', 'Volume')}],
+                'adjclose': [{'adjclose': data['Adj Close'].tolist()}],
+            },
+        }], 'error': None}}
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server._count('requests')
+                url = urlparse(self.path)
+                wait = server.bucket.try_acquire()
+                if wait > 0:
+                    server._count('throttled')
+                    self.send_response(429)
+                    self.send_header('Retry-After', str(math.ceil(wait)))
+                    self.end_headers()
+                    return
+                payload = server.chart(url.path.rsplit('/', 1)[-1], parse_qs(url.query))
+                if payload is None:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                body = json.dumps(payload).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logging.debug(format % args)
+
+        return Handler
+
+    def start(self):
+        """
+        Serve in a background thread, returns the base URL for http_client.FetchClient
+        """
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+# Main program
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Serve synthetic bars through a throttling stub of the chart API")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--rate', type=float, default=20.0, help="Requests per second before answering 429")
+    parser.add_argument('--empty-rate', type=float, default=0.0, help="Share of responses without bars")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the synthetic bars")
+    args = parser.parse_args()
+    server = StubChartServer(args.rate, empty_rate=args.empty_rate, seed=args.seed, port=args.port)
+    logging.info(f"Serving {server.base_url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
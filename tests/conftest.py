@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+from providers import SyntheticProvider, synthetic_symbols
+
+# Synthetic symbols and bars the kernels and the streaming states are checked on
+SYMBOLS = 8
+BARS = 400
+
+def _with_gaps(data):
+    """
+    Copy of the bars with a flat stretch (RSV 0 / 0 for the KDJ), missing bars at the start and
+    missing runs of irregular lengths, where the EMAs skip values
+    """
+    gapped = data.copy()
+    prices = gapped.columns.get_indexer([column for column in gapped.columns if column != 'Volume'])
+    gapped.iloc[100:112, prices] = 50.0
+    for start, length in ((0, 3), (150, 1), (201, 2), (260, 5), (331, 1), (333, 1)):
+        gapped.iloc[start:start + length] = np.nan
+    return gapped
+
+def _cases():
+    frames = SyntheticProvider(bars=BARS).fetch(synthetic_symbols(SYMBOLS))
+    cases = []
+    for symbol, data in frames.items():
+        cases.append(pytest.param(data, id=symbol))
+        cases.append(pytest.param(_with_gaps(data), id=f"{symbol}-gaps"))
+    return cases
+
+def pytest_generate_tests(metafunc):
+    if 'bars' in metafunc.fixturenames:
+        metafunc.parametrize('bars', _cases())
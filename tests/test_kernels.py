@@ -0,0 +1,24 @@
+import pytest
+import kernels
+import indicators
+
+@pytest.fixture(params=[name for name in kernels.BACKENDS if name != 'numba' or kernels.numba is not None])
+def backend(request):
+    previous = kernels.get_backend()
+    kernels.set_backend(request.param)
+    yield request.param
+    kernels.set_backend(previous)
+
+def test_kernels_match_pandas(bars, backend):
+    assert indicators.get_engine() == 'pandas'
+    kernels.check_equivalence(bars)
+
+@pytest.mark.parametrize('span', [3, 9, 12, 26])
+def test_gap_weights_match_pandas(span):
+    import numpy as np
+    import pandas as pd
+    values = pd.Series([1.0, np.nan, np.nan, 4.0, np.nan, 2.0, 3.0])
+    expected = values.ewm(span=span, adjust=False).mean().to_numpy()
+    result = np.empty(len(values))
+    kernels._ema_loop(values.to_numpy(), 2 / (span + 1), kernels.gap_weights(span), result)
+    np.testing.assert_allclose(result, expected, rtol=1e-12, atol=0)
@@ -0,0 +1,4 @@
+import streaming
+
+def test_states_match_batch(bars):
+    streaming.check_equivalence(bars)
@@ -0,0 +1,163 @@
+import pandas as pd
+import os
+import time
+import logging
+import argparse
+import functools
+import threading
+from datetime import date, datetime
+from io import StringIO
+
+# Dated universe snapshots are kept as <SNAPSHOT_DIR>/<universe>/<YYYY-MM-DD>.csv
+SNAPSHOT_DIR = "universe_snapshots"
+# Age in days after which a snapshot is refreshed in the background
+TTL_DAYS = 1
+
+def fetch_nasdaq_traded():
+    """
+    Get all currently listed US stocks with their listing metadata from NASDAQ Traded List
+    """
+    import requests
+    url = "https://www.nasdaqtrader.com/dynamic/SymDir/nasdaqtraded.txt"
+    response = requests.get(url)
+    response.raise_for_status()
+    df = pd.read_csv(StringIO(response.text), sep='|')
+    df = df[df['Symbol'].notna()]  # Drop the file creation time footer
+    df = df[df['ETF'] == 'N']  # Exclude ETFs
+    df = df[df['Financial Status'] != 'D']  # Exclude deficient stocks
+    df = df[df['Test Issue'] == 'N']  # Exclude test issues
+    logging.info(f"Fetched {len(df)} symbols from NASDAQ Traded List")
+    return df.reset_index(drop=True)
+
+def fetch_sp500():
+    """
+    Get the S&P 500 constituents from Wikipedia
+    """
+    url = "https://en.wikipedia.org/wiki/List_of_S%26P_500_companies"
+    for _ in range(3):  # Retry 3 times
+        try:
+            tables = pd.read_html(url)
+            return tables[0]
+        except Exception as e:
+            logging.error(f"Error fetching S&P 500 list: {e}")
+            time.sleep(5)  # Wait 5 seconds before retrying
+    raise RuntimeError("Could not fetch the S&P 500 list")
+
+UNIVERSES = {
+    'nasdaq': fetch_nasdaq_traded,
+    'sp500': fetch_sp500,
+}
+
+_refreshing = set()
+_lock = threading.Lock()
+
+def snapshot_dates(name, snapshot_dir=SNAPSHOT_DIR):
+    """
+    Dates of the stored snapshots of a universe, oldest first
+    """
+    path = os.path.join(snapshot_dir, name)
+    if not os.path.isdir(path):
+        return []
+    return sorted(datetime.strptime(file[:-len('.csv')], '%Y-%m-%d').date() for file in os.listdir(path) if file.endswith('.csv'))
+
+def save_snapshot(name, table, as_of=None, snapshot_dir=SNAPSHOT_DIR):
+    """
+    Store a universe table as the snapshot of the given date (today by default)
+    """
+    as_of = as_of or date.today()
+    os.makedirs(os.path.join(snapshot_dir, name), exist_ok=True)
+    path = os.path.join(snapshot_dir, name, f"{as_of:%Y-%m-%d}.csv")
+    table.to_csv(path + ".tmp", index=False)
+    os.replace(path + ".tmp", path)
+
+def load_snapshot(name, as_of=None, snapshot_dir=SNAPSHOT_DIR):
+    """
+    Latest snapshot of a universe taken on or before as_of, None if there is none
+    """
+    dates = [d for d in snapshot_dates(name, snapshot_dir) if as_of is None or d <= as_of]
+    if not dates:
+        return None
+    path = os.path.join(snapshot_dir, name, f"{dates[-1]:%Y-%m-%d}.csv")
+    return pd.read_csv(path, keep_default_na=False, na_values=[''])
+
+def refresh_universe(name, snapshot_dir=SNAPSHOT_DIR):
+    """
+    Fetch a universe and store it as today's snapshot, None if the fetch failed
+    """
+    try:
+        table = UNIVERSES[name]()
+    except Exception as e:
+        logging.error(f"Error fetching universe {name}: {e}")
+        return None
+    if table.empty:
+        return None
+    save_snapshot(name, table, snapshot_dir=snapshot_dir)
+    return table
+
+def _refresh_in_background(name, snapshot_dir):
+    def run():
+        try:
+            refresh_universe(name, snapshot_dir)
+        finally:
+            with _lock:
+                _refreshing.discard((name, snapshot_dir))
+
+    with _lock:
+        if (name, snapshot_dir) in _refreshing:
+            return
+        _refreshing.add((name, snapshot_dir))
+    threading.Thread(target=run, daemon=True).start()
+
+def get_universe(name, ttl_days=TTL_DAYS, refresh=False, snapshot_dir=SNAPSHOT_DIR):
+    """
+    Universe table from the latest snapshot without any network call
+    A snapshot older than ttl_days is refreshed in the background, refresh=True refreshes before returning
+    Only when there is no snapshot at all the universe is fetched right away
+    """
+    if refresh:
+        table = refresh_universe(name, snapshot_dir)
+        if table is not None:
+            return table
+    dates = snapshot_dates(name, snapshot_dir)
+    if not dates:
+        table = refresh_universe(name, snapshot_dir)
+        return table if table is not None else pd.DataFrame(columns=['Symbol'])
+    if (date.today() - dates[-1]).days >= ttl_days:
+        _refresh_in_background(name, snapshot_dir)
+    return load_snapshot(name, snapshot_dir=snapshot_dir)
+
+def symbols_as_of(name, as_of, snapshot_dir=SNAPSHOT_DIR):
+    """
+    Symbols of a universe as of a past date, e.g. the constituents at the start of a backtest
+    """
+    table = load_snapshot(name, as_of, snapshot_dir)
+    return tuple(table['Symbol']) if table is not None else tuple()
+
+@functools.lru_cache(maxsize=None)
+def get_all_listed_us_stocks():
+    """
+    Get the list of all currently listed US stocks from the latest NASDAQ Traded List snapshot
+    """
+    return tuple(get_universe('nasdaq')['Symbol'])
+
+@functools.lru_cache(maxsize=None)
+def get_sp500_symbols():
+    """
+    Get the list of S&P 500 stock symbols from the latest snapshot
+    """
+    return tuple(get_universe('sp500')['Symbol'])
+
+# Main program
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Refresh the stored universe snapshots")
+    # No choices here: argparse (Python 3.11) checks the empty list of a bare call against them and fails
+    parser.add_argument('universes', nargs='*', help=f"Universes to refresh out of {', '.join(UNIVERSES)}, defaults to all of them")
+    args = parser.parse_args()
+    unknown = [name for name in args.universes if name not in UNIVERSES]
+    if unknown:
+        parser.error(f"Unknown universes: {', '.join(unknown)} (choose from {', '.join(UNIVERSES)})")
+    for name in args.universes or list(UNIVERSES):
+        table = refresh_universe(name)
+        if table is not None:
+            logging.info(f"Stored {len(table)} symbols of {name} in {SNAPSHOT_DIR}")